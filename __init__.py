@@ -8,7 +8,14 @@ bl_info = {
     "category": "Paint"
 }
 
-from . import operators, properties, ui, preferences
+try:
+	import bpy
+except ImportError:
+	# the layout worker processes only import the packers, which don't need Blender
+	bpy = None
+
+if bpy is not None:
+	from . import operators, properties, ui, preferences, packing_list
 
 
 def register():
@@ -16,8 +23,10 @@ def register():
 	properties.register()
 	operators.register()
 	ui.register()
+	packing_list.register()
 
 def unregister():
+	packing_list.unregister()
 	ui.unregister()
 	operators.unregister()
 	properties.unregister()
@@ -0,0 +1,372 @@
+"""Builds packed images from image files without the Blender UI.
+
+    python -m image_packer.cli textures/*.png -o atlas.png --packing-mode skyline_packing
+    python -m image_packer.cli --manifest atlases.json --jobs 4
+
+Inside Blender, which also reads every image format Blender supports:
+
+    blender --background --python-expr "import sys; from bl_ext.user_default.image_packer import cli; sys.exit(cli.main())" -- textures/*.png -o atlas.png
+
+Prints a JSON summary, the exit code is 0 when every packed image was built, 1 when any failed
+and 2 for invalid arguments.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import random
+import argparse
+import importlib.machinery
+import numpy as np
+
+from types import SimpleNamespace
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+try:
+    import bpy
+except ImportError:
+    bpy = None
+
+from .core.items import make_items, items_on_page
+from .core.layout import ItemTooLargeError, pack_pages
+from .core.composite import iter_packed_bands
+from .core.resample import PIXEL_DTYPES
+from .core.png_reader import read_png, read_png_header
+
+
+# Defaults of the ImagePacker properties the packed image depends on
+DEFAULT_SETTINGS = {
+    "packing_mode": "square_packing",
+    "side_mode": "min",
+    "side_switch": "width",
+    "side_length": 512,
+    "keep_aspect_ratio": True,
+    "padding": 0,
+    "aspect_ratio_mode": "med",
+    "aspect_ratio_width": 1.0,
+    "aspect_ratio_height": 1.0,
+    "random_order": False,
+    "random_seed": 0,
+    "maxrects_heuristic": "short_side",
+    "skyline_waste_map": True,
+    "shelf_mode": "next_fit",
+    "balanced_rows": False,
+    "justify_rows": False,
+    "shortest_column": False,
+    "sort_by_height": False,
+    "allow_rotation": False,
+    "optimize_size": False,
+    "power_of_two": False,
+    "max_size": 0,
+    "auto_seeds": 4,
+    "auto_time_budget": 2.0,
+    "max_atlas_size": 0,
+    "resample_filter": "bilinear",
+    "composite_mode": "auto",
+    "band_height": 1024,
+    "page_mode": "pages",
+    "bg_color": (0.5, 0.5, 0.5, 1.0),
+}
+
+# Values of the settings that are enums
+SETTING_CHOICES = {
+    "packing_mode": ("square_packing", "row_packing", "col_packing", "nextfit_packing",
+                     "maxrects_packing", "skyline_packing", "auto_packing", "exact_packing"),
+    "side_mode": ("min", "max", "avg", "med", "custom"),
+    "side_switch": ("width", "height"),
+    "aspect_ratio_mode": ("med", "custom"),
+    "maxrects_heuristic": ("short_side", "area", "bottom_left", "contact_point"),
+    "shelf_mode": ("next_fit", "first_fit", "best_fit"),
+    "resample_filter": ("box", "bilinear", "lanczos"),
+    "composite_mode": ("auto", "float", "half", "byte"),
+    "page_mode": ("pages", "udim"),
+}
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+
+def linear_to_srgb(value):
+    if value <= 0.0031308:
+        return value * 12.92
+    return 1.055 * value ** (1 / 2.4) - 0.055
+
+
+def coerce_setting(name, value):
+    """Converts an option to the type of the setting, e.g. "2" from a manifest to 2"""
+    default = DEFAULT_SETTINGS[name]
+    try:
+        if isinstance(default, bool):
+            if isinstance(value, str) and value.lower() in ("true", "false", "1", "0"):
+                return value.lower() in ("true", "1")
+            if isinstance(value, (bool, int)) and value in (0, 1):
+                return bool(value)
+        elif isinstance(default, tuple):
+            if isinstance(value, str):
+                value = value.split(",")
+            if len(value) == len(default):
+                return tuple(float(item) for item in value)
+        elif isinstance(default, int):
+            if not isinstance(value, bool) and float(value) == int(float(value)):
+                return int(float(value))
+        elif isinstance(default, float):
+            if not isinstance(value, bool):
+                return float(value)
+        elif isinstance(value, str):
+            return value
+    except (TypeError, ValueError):
+        pass
+    raise ValueError("{} must be {}, not {!r}".format(
+        name, "a list of {} numbers".format(len(default)) if isinstance(default, tuple)
+        else "a " + type(default).__name__, value))
+
+
+def make_settings(options):
+    """Settings of a packed image from the defaults and the given options, like the ImagePacker
+    properties the layout modes read"""
+    unknown = set(options) - set(DEFAULT_SETTINGS)
+    if unknown:
+        raise ValueError("Unknown options: {}".format(", ".join(sorted(unknown))))
+
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update((name, coerce_setting(name, value)) for name, value in options.items())
+    for name, choices in SETTING_CHOICES.items():
+        if settings[name] not in choices:
+            raise ValueError("{} must be one of {}".format(name, ", ".join(choices)))
+    return SimpleNamespace(**settings)
+
+
+def expand_inputs(patterns, root=""):
+    """Sorted image files matching the glob patterns, relative patterns start at root"""
+    paths = set()
+    for pattern in patterns:
+        pattern = os.path.join(root, os.path.expanduser(pattern))
+        paths.update(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+    return sorted(paths)
+
+
+def get_page_filepath(output, page, page_mode):
+    """File of a page, with the same suffixes as the pages of the add-on"""
+    if page is None:
+        return output
+    root, ext = os.path.splitext(output)
+    if page_mode == "udim":
+        return "{}.{}{}".format(root, 1001 + page, ext)
+    return "{}_{}{}".format(root, page, ext)
+
+
+def open_images(paths):
+    """Sizes, float flags, a read_pixels(i, scratch) reader and a close function of the image files.
+    Blender reads every format it supports, plain Python reads PNG files"""
+    if bpy is None:
+        headers = [read_png_header(path) for path in paths]
+
+        def read_pixels(i, scratch):
+            return read_png(paths[i]), scratch
+
+        return ([(w, h) for w, h, _ in headers], [bit_depth == 16 for _, _, bit_depth in headers],
+                read_pixels, lambda: None)
+
+    imgs = [bpy.data.images.load(path, check_existing=False) for path in paths]
+
+    def read_pixels(i, scratch):
+        w, h = imgs[i].size
+        if scratch is None or scratch.size < w * h * 4:
+            scratch = np.empty(w * h * 4, 'f')
+        img_pixels = scratch[:w * h * 4]
+        imgs[i].pixels.foreach_get(img_pixels)
+        return img_pixels.reshape(h, w, 4), scratch
+
+    def close():
+        for img in imgs:
+            bpy.data.images.remove(img)
+
+    return [tuple(img.size) for img in imgs], [img.is_float for img in imgs], read_pixels, close
+
+
+def build_packed_image(inputs, output, options=None, root="", workers=1):
+    """Packs the image files matching the input globs into PNG files at output, split in pages when
+    they're larger than max_atlas_size. Returns the summary of the packed image"""
+    start_time = time.perf_counter()
+    settings = make_settings(options or {})
+    paths = expand_inputs(inputs, root)
+    if not paths:
+        raise ValueError("No images match {}".format(", ".join(inputs)))
+    if settings.random_order:
+        random.Random(settings.random_seed).shuffle(paths)
+
+    output = os.path.join(root, os.path.expanduser(output))
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+
+    sizes, is_float, read_pixels, close = open_images(paths)
+    try:
+        try:
+            page_sizes, items = pack_pages(make_items(sizes), settings, workers)
+        except ItemTooLargeError as error:
+            raise ValueError("{} is larger than the maximal atlas size of {}px".format(
+                paths[error.item_id], error.max_size)) from None
+
+        mode = settings.composite_mode
+        if mode == "auto":
+            mode = "float" if any(is_float) else "byte"
+        bg_color = [linear_to_srgb(value) for value in settings.bg_color[:3]] + [settings.bg_color[3]]
+
+        pages = []
+        for page, size in enumerate(page_sizes):
+            page_items = items_on_page(items, page)
+            ids = page_items["id"].tolist()
+            filepath = get_page_filepath(output, page if len(page_sizes) > 1 else None, settings.page_mode)
+            for _ in iter_packed_bands(filepath, size, page_items, lambda i, scratch: read_pixels(ids[i], scratch),
+                                       settings.resample_filter, settings.band_height, bg_color, PIXEL_DTYPES[mode]):
+                pass
+
+            used_area = int(np.sum(page_items["w"] * page_items["h"]))
+            pages.append({
+                "filepath": filepath,
+                "size": list(size),
+                "images": [paths[i] for i in ids],
+                "occupancy": round(used_area / (size[0] * size[1]), 4),
+            })
+    finally:
+        close()
+
+    return {
+        "output": output,
+        "images": len(paths),
+        "pages": pages,
+        "seconds": round(time.perf_counter() - start_time, 3),
+    }
+
+
+def build_job(job, root="", workers=1):
+    """Summary of a manifest entry, with the error instead when it failed. Any error only fails
+    this packed image, so the others are still built and summarized"""
+    options = dict(job)
+    inputs = options.pop("inputs", None)
+    output = options.pop("output", None)
+    if not inputs or not output:
+        return {"output": output, "error": "Every packed image needs inputs and an output"}
+    if isinstance(inputs, str):
+        inputs = [inputs]
+
+    try:
+        return build_packed_image(inputs, output, options, root, workers)
+    except (ValueError, OSError) as error:
+        return {"output": output, "error": str(error)}
+    except Exception as error:
+        # unexpected errors of a single packed image, e.g. of a broken file
+        return {"output": output, "error": "{}: {}".format(type(error).__name__, error)}
+
+
+def build_manifest(manifest_path, jobs=1, workers=1, options=None):
+    """Builds every packed image of a JSON manifest, either a list of packed images or an object
+    with a "defaults" object of options and an "atlases" list. Every packed image has "inputs"
+    globs, an "output" file and any options. Its options override the command line options, which
+    override the defaults of the manifest. Relative paths start at the manifest"""
+    with open(manifest_path) as file:
+        manifest = json.load(file)
+    if isinstance(manifest, list):
+        manifest = {"atlases": manifest}
+    defaults = {**manifest.get("defaults", {}), **(options or {})}
+    entries = [{**defaults, **entry} for entry in manifest["atlases"]]
+    root = os.path.dirname(os.path.abspath(manifest_path))
+
+    # Inside Blender the workers would have no bpy to read images with, and add-ons loaded as
+    # bl_ext.* packages can't be imported by them at all
+    importable = importlib.machinery.PathFinder.find_spec(__name__.partition(".")[0]) is not None
+    if jobs <= 1 or len(entries) <= 1 or bpy is not None or not importable:
+        return [build_job(entry, root, workers) for entry in entries]
+
+    # spawn, forking would copy the whole state into every worker
+    with ProcessPoolExecutor(min(jobs, len(entries)), mp_context=get_context("spawn")) as executor:
+        futures = [executor.submit(build_job, entry, root, 1) for entry in entries]
+        results = []
+        for entry, future in zip(entries, futures):
+            try:
+                results.append(future.result())
+            except BrokenProcessPool as error:
+                results.append({"output": entry.get("output"), "error": "Worker process failed: {}".format(error)})
+        return results
+
+
+def parse_value(name, text):
+    """Converts a command line value to the type of the setting"""
+    default = DEFAULT_SETTINGS[name]
+    if isinstance(default, tuple):
+        return tuple(float(value) for value in text.split(","))
+    return type(default)(text)
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        prog="image_packer", description="Packs images into a single image, or into pages of images")
+    parser.add_argument("inputs", nargs="*", help="Glob patterns of the images to pack")
+    parser.add_argument("-o", "--output", help="PNG file of the packed image")
+    parser.add_argument("-m", "--manifest", help="JSON file describing several packed images")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Packed images of the manifest built at the same time")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Processes Auto Packing uses for a single packed image")
+    parser.add_argument("--summary", help="Writes the JSON summary to this file instead of stdout")
+
+    settings = parser.add_argument_group("packing settings", "Mirror the settings of the add-on")
+    for name, default in DEFAULT_SETTINGS.items():
+        flag = "--" + name.replace("_", "-")
+        if isinstance(default, bool):
+            settings.add_argument(flag, dest=name, action=argparse.BooleanOptionalAction, default=None)
+        elif isinstance(default, tuple):
+            settings.add_argument(flag, dest=name, type=lambda text: parse_value("bg_color", text),
+                                  metavar="R,G,B,A", help="Linear colour, default {}".format(
+                                      ",".join(str(value) for value in default)))
+        else:
+            settings.add_argument(flag, dest=name, type=type(default), choices=SETTING_CHOICES.get(name),
+                                  help="Default {}".format(default))
+    return parser
+
+
+def main(argv=None):
+    if argv is None:
+        # Blender passes the arguments of the script after --
+        argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+    parser = make_parser()
+    try:
+        args = parser.parse_args(argv)
+    except SystemExit as error:
+        return error.code
+
+    options = {name: value for name, value in vars(args).items()
+               if name in DEFAULT_SETTINGS and value is not None}
+    if args.manifest:
+        if args.inputs or args.output:
+            parser.print_usage(sys.stderr)
+            print("Inputs and output are given by the manifest", file=sys.stderr)
+            return EXIT_USAGE
+        try:
+            results = build_manifest(args.manifest, args.jobs, args.workers, options)
+        except (OSError, ValueError, KeyError, TypeError) as error:
+            print("Can't read the manifest: {}".format(error), file=sys.stderr)
+            return EXIT_USAGE
+    elif args.inputs and args.output:
+        results = [build_job({"inputs": args.inputs, "output": args.output, **options}, workers=args.workers)]
+    else:
+        parser.print_usage(sys.stderr)
+        print("Give input globs and an output file, or a manifest", file=sys.stderr)
+        return EXIT_USAGE
+
+    failed = sum("error" in result for result in results)
+    summary = json.dumps({"atlases": results, "failed": failed}, indent=2)
+    if args.summary:
+        with open(args.summary, "w") as file:
+            file.write(summary)
+    else:
+        print(summary)
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+# Packing, layout and compositing without Blender, so it runs in worker processes and headless tools
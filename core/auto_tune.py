@@ -0,0 +1,163 @@
+import os
+import sys
+import random
+import time
+import importlib
+import importlib.machinery
+from concurrent.futures import ProcessPoolExecutor, TimeoutError, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+from .maxrects import pack_maxrects
+from .skyline import pack_skyline
+from .shelf import pack_shelves
+
+
+# Sort orders tried on the packers that place the sizes in the given order, largest first
+SORT_ORDERS = {
+    "height": lambda size: (-size[1], -size[0]),
+    "width": lambda size: (-size[0], -size[1]),
+    "area": lambda size: (-size[0] * size[1], -max(size)),
+    "max_side": lambda size: (-max(size), -min(size)),
+    "perimeter": lambda size: (-(size[0] + size[1]), -max(size)),
+}
+
+MAXRECTS_HEURISTICS = ("short_side", "area", "bottom_left", "contact_point")
+
+# This module as spawned workers import it, False when they can't, None until checked
+worker_module = None
+
+
+def get_worker_module():
+    """This module under a name spawned workers can import, or None. Add-ons loaded as bl_ext.*
+    packages only exist inside Blender, so then the bpy-free core package is imported as the top
+    level core package from the add-on directory, which the workers find on the sys.path they get
+    from this process"""
+    global worker_module
+    if worker_module is None:
+        core_dir = os.path.dirname(os.path.abspath(__file__))
+        loaded_core = sys.modules.get("core")
+        if importlib.machinery.PathFinder.find_spec(__name__.partition(".")[0]) is not None:
+            worker_module = sys.modules[__name__]
+        elif loaded_core is not None and os.path.dirname(os.path.abspath(loaded_core.__file__ or "")) != core_dir:
+            # another top level core package is loaded already
+            worker_module = False
+        else:
+            addon_dir = os.path.dirname(core_dir)
+            if addon_dir not in sys.path:
+                sys.path.append(addon_dir)
+            try:
+                worker_module = importlib.import_module("core.auto_tune")
+            except ImportError:
+                worker_module = False
+    return worker_module or None
+
+
+def workers_available():
+    """Whether spawned workers can import the packers, checked once"""
+    return get_worker_module() is not None
+
+
+def stop_workers(executor):
+    """Shuts the pool down without waiting for the candidates the workers are still packing"""
+    processes = list((getattr(executor, "_processes", None) or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+
+
+def get_candidates(seeds, base_seed=0):
+    """(packer, option, order) of every layout the auto mode tries, an int order is the seed of a
+    shuffled order. The sorted orders come first, so the best layouts are found early"""
+    packers = ([("shelf", "next_fit")]
+               + [("maxrects", heuristic) for heuristic in MAXRECTS_HEURISTICS]
+               + [("skyline", True), ("skyline", False)])
+    # first and best fit need the sizes on decreasing height and sort them themselves
+    candidates = [("shelf", "first_fit", None), ("shelf", "best_fit", None)]
+    for order in list(SORT_ORDERS) + [base_seed + i for i in range(seeds)]:
+        for packer, option in packers:
+            candidates.append((packer, option, order))
+    return candidates
+
+
+def evaluate_candidate(sizes, bin_width, candidate, allow_rotation=False):
+    """Packs the (w, h) sizes for a candidate, returns the occupancy of the layout, the candidate,
+    the top left corner of every size in the given order, the used width and height and whether
+    each size is rotated"""
+    packer, option, order = candidate
+    indices = list(range(len(sizes)))
+    if isinstance(order, str):
+        indices.sort(key=lambda i: SORT_ORDERS[order](sizes[i]))
+    elif order is not None:
+        random.Random(order).shuffle(indices)
+    ordered = [sizes[i] for i in indices]
+
+    match packer:
+        case "shelf":
+            layout = pack_shelves(ordered, bin_width, option, allow_rotation)
+        case "maxrects":
+            layout = pack_maxrects(ordered, bin_width, option, allow_rotation, sort=False)
+        case "skyline":
+            layout = pack_skyline(ordered, bin_width, option, allow_rotation, sort=False)
+    ordered_pos, max_w, max_h, ordered_rotated = layout
+
+    imgs_pos = [None] * len(sizes)
+    imgs_rotated = [False] * len(sizes)
+    for i, pos, rotated in zip(indices, ordered_pos, ordered_rotated):
+        imgs_pos[i] = pos
+        imgs_rotated[i] = rotated
+
+    occupancy = sum(w * h for w, h in sizes) / max(1, max_w * max_h)
+    return occupancy, candidate, imgs_pos, max_w, max_h, imgs_rotated
+
+
+def auto_pack(sizes, bin_width, allow_rotation=False, seeds=4, base_seed=0, time_budget=2.0, workers=1):
+    """Packs the (w, h) sizes in a strip of bin_width with every candidate of get_candidates and
+    returns the result of evaluate_candidate with the highest occupancy. The first candidate is
+    always packed here, a process pool packs the others until time_budget seconds have passed and
+    is then stopped. Without workers, or when they can't import the packers, the others are
+    packed here one after the other until the time is up"""
+    global worker_module
+    candidates = get_candidates(seeds, base_seed)
+    deadline = time.perf_counter() + time_budget
+    best = None
+    done = set()
+
+    def keep(result):
+        nonlocal best
+        done.add(result[1])
+        if best is None or result[0] > best[0]:
+            best = result
+
+    keep(evaluate_candidate(sizes, bin_width, candidates[0], allow_rotation))
+
+    workers = min(workers, os.cpu_count() or 1, len(candidates) - 1)
+    pooled = workers > 1 and workers_available()
+    if pooled:
+        # spawn, forking Blender would copy its whole state into every worker
+        executor = ProcessPoolExecutor(workers, mp_context=get_context("spawn"))
+        try:
+            evaluate = get_worker_module().evaluate_candidate
+            futures = [executor.submit(evaluate, sizes, bin_width, candidate, allow_rotation)
+                       for candidate in candidates[1:]]
+            for future in as_completed(futures, timeout=max(0, deadline - time.perf_counter())):
+                keep(future.result())
+        except TimeoutError:
+            pass
+        except (BrokenProcessPool, ImportError):
+            # the workers can't import the packers, so the remaining candidates are packed here
+            worker_module = False
+            pooled = False
+        finally:
+            stop_workers(executor)
+
+    if not pooled:
+        for candidate in candidates:
+            if time.perf_counter() >= deadline:
+                break
+            if candidate not in done:
+                keep(evaluate_candidate(sizes, bin_width, candidate, allow_rotation))
+
+    return best
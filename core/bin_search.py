@@ -0,0 +1,99 @@
+from math import ceil, sqrt
+
+
+def next_power_of_two(value):
+    return 1 << max(0, int(value) - 1).bit_length()
+
+
+def fit_atlas(w, h, ratio=None, power_of_two=False):
+    """Smallest atlas around a (w, h) layout, widened or heightened to the ratio when given
+    and rounded up to powers of two"""
+    if ratio:
+        w, h = max(w, ceil(h * ratio)), max(h, ceil(w / ratio))
+    if power_of_two:
+        w, h = next_power_of_two(w), next_power_of_two(h)
+    return w, h
+
+
+# Factor the width grows by until the layout fits the ratio, packers fill most of the area
+GROWTH = 1.125
+# Relative width difference at which the binary search stops
+TOLERANCE = 1 / 100
+
+
+def search_bin_size(pack, sizes, bin_width, ratio, fixed_ratio=False, power_of_two=False, max_size=0):
+    """Searches the strip width that gives the smallest atlas for the (w, h) sizes.
+    pack(bin_width, max_height) returns (imgs_pos, max_w, max_h, imgs_rotated) or None when the
+    layout gets taller than max_height. Starting from the layout at bin_width, the width is
+    binary searched for the smallest layout that fits the ratio, with power_of_two the power of two
+    widths around it are tried instead. With fixed_ratio the atlas is extended to the ratio,
+    otherwise it is cropped to the layout. Atlases larger than max_size are skipped, 0 is no limit.
+    Returns the atlas size, imgs_pos and imgs_rotated"""
+    min_width = max(w for w, h in sizes)
+    max_size = max_size or float("inf")
+    atlas_ratio = ratio if fixed_ratio else None
+    if min_width > max_size:
+        raise ValueError("An image is larger than the maximal size of {}px".format(max_size))
+
+    best = None
+
+    def try_width(bin_width, max_height):
+        """Packs one strip and keeps it when it gives the smallest atlas so far"""
+        nonlocal best
+        max_height = min(max_height, max_size)
+        layout = pack(bin_width, None if max_height == float("inf") else int(max_height))
+        if layout is None:
+            return False
+
+        imgs_pos, max_w, max_h, imgs_rotated = layout
+        size = fit_atlas(max_w, max_h, atlas_ratio, power_of_two)
+        if max(size) <= max_size:
+            key = (size[0] * size[1], max(size))
+            if best is None or key < best[0]:
+                best = (key, size, imgs_pos, imgs_rotated)
+        return True
+
+    # the search never gives a larger atlas than the unsearched layout
+    try_width(min(bin_width, max_size), float("inf"))
+
+    # no layout is smaller than the images, so the search starts at the width of a perfect fit
+    total_area = sum(w * h for w, h in sizes)
+    low = max(min_width, ceil(sqrt(total_area * ratio)))
+
+    if power_of_two:
+        # the power of two widths around the perfect fit, the closest first so the best atlas
+        # so far limits the height of the next ones
+        width = max(next_power_of_two(min_width), next_power_of_two(low) // 2)
+        widths = []
+        while width <= min(max_size, 2 * next_power_of_two(low)):
+            widths.append(width)
+            width *= 2
+        for width in sorted(widths, key=lambda width: abs(width - low)):
+            max_height = best[0][0] // width if best else float("inf")
+            try_width(width, max_height)
+    else:
+        # the smallest width whose layout is no taller than the ratio allows
+        # the binary search below also tries the widths under the first one that fits
+        high = min(ceil(low * GROWTH), max_size)
+        fits = try_width(high, high / ratio)
+        while not fits and high < max_size:
+            low = high + 1
+            high = min(ceil(high * GROWTH), max_size)
+            fits = try_width(high, high / ratio)
+
+        # a layout within the tolerance of the smallest width is tight enough
+        while fits and high - low > high * TOLERANCE:
+            width = (low + high) // 2
+            if try_width(width, width / ratio):
+                high = width
+            else:
+                low = width + 1
+
+    if best is None:
+        # the ratio can't be met within max_size, any layout that fits will do
+        try_width(max_size, float("inf"))
+    if best is None:
+        raise ValueError("The images don't fit in the maximal size of {}px".format(max_size))
+
+    _, size, imgs_pos, imgs_rotated = best
+    return size, imgs_pos, imgs_rotated
@@ -0,0 +1,151 @@
+import os
+import numpy as np
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .items import item_rects
+from .resample import resample_pixels, store_pixels
+from .png_writer import PNGStreamWriter
+
+
+def make_packed_pixels(size, bg_color, dtype='f'):
+    """Packed pixels array filled with the sRGBA background colour"""
+    packed_pixels = np.empty((size[1], size[0], 4), dtype)
+    store_pixels(packed_pixels, np.asarray(bg_color, 'f'))
+    return packed_pixels
+
+
+def resample_into(img_pixels, img_rect, filter_type, out):
+    """Resamples the image pixels into out, which has the size of the (x, y, w, h, rotated) rect.
+    Rotated images are turned 90 degrees counter-clockwise"""
+    w, h, rotated = img_rect[2:]
+    if rotated:
+        # writing through a rotated view rotates the pixels without resampling them
+        resample_pixels(img_pixels, h, w, filter_type, out=np.rot90(out))
+    else:
+        resample_pixels(img_pixels, w, h, filter_type, out=out)
+
+
+def composite_img(packed_pixels, img_pixels, img_rect, filter_type, tile_cache=None, tile_key=None):
+    """Resamples the image pixels straight into their region of the packed pixels,
+    the resized region is stored in the tile cache when a tile_key is given"""
+    region = get_img_region(packed_pixels, img_rect)
+    resample_into(img_pixels, img_rect, filter_type, region)
+    if tile_key is not None:
+        tile_cache.put(tile_key, region)
+
+
+def get_img_region(packed_pixels, img_rect):
+    x, y, w, h = img_rect[:4]
+    packed_h = packed_pixels.shape[0]
+    return packed_pixels[packed_h-(y+h): packed_h-y, x: x+w, :4]
+
+
+def iter_col_pixels(packed_pixels, items, read_pixels, filter_type, workers=1, tile_cache=None, tile_key=None):
+    """Composites every packed item straight into its region of the packed pixels, yields after each one.
+    read_pixels(i, scratch) returns the (h, w, 4) source pixels of the i-th item and the scratch buffer
+    it may reuse, tile_key(i) the tile cache key of the i-th item or None. Both are only called from
+    the calling thread, so they may touch Blender data"""
+    imgs_rect = item_rects(items)
+
+    def get_cached_tile(i):
+        if tile_cache is None:
+            return None, None
+        key = tile_key(i)
+        if key is None:
+            return None, None
+        return tile_cache.get(key), key
+
+    if workers > 1 and len(items) > 1:
+        # the resampling and placing is done by the pool in disjoint regions
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for i, img_rect in enumerate(imgs_rect):
+                tile, key = get_cached_tile(i)
+                if tile is not None:
+                    get_img_region(packed_pixels, img_rect)[...] = tile
+                    yield
+                    continue
+
+                img_pixels, _ = read_pixels(i, None)
+                pending.append(executor.submit(
+                    composite_img, packed_pixels, img_pixels, img_rect, filter_type, tile_cache, key))
+
+                # limit the amount of source images held in memory
+                if len(pending) >= 2 * workers:
+                    pending.popleft().result()
+                    yield
+            while pending:
+                pending.popleft().result()
+                yield
+    else:
+        # a single scratch buffer is reused to read the source pixels of every image
+        scratch = None
+        for i, img_rect in enumerate(imgs_rect):
+            tile, key = get_cached_tile(i)
+            if tile is not None:
+                get_img_region(packed_pixels, img_rect)[...] = tile
+            else:
+                img_pixels, scratch = read_pixels(i, scratch)
+                composite_img(packed_pixels, img_pixels, img_rect, filter_type, tile_cache, key)
+            yield
+
+
+def iter_packed_bands(filepath, size, items, read_pixels, filter_type, band_height, bg_color,
+                      dtype='f', tile_cache=None, tile_key=None):
+    """Composites the packed image in horizontal bands and streams each band to a PNG file,
+    yields after each item. Only the images overlapping the current band are kept in memory.
+    read_pixels and tile_key work like in iter_col_pixels"""
+    width, height = size
+    bg_color = np.asarray(bg_color, 'f')
+    bit_depth = 8 if dtype == np.uint8 else 16
+    imgs_rect = item_rects(items)
+    writer = PNGStreamWriter(filepath, width, height, bit_depth)
+
+    # images sorted on their top so they can be loaded once the bands reach them
+    order = sorted(range(len(imgs_rect)), key=lambda i: imgs_rect[i][1])
+    next_img = 0
+    tiles = {}
+    scratch = None
+
+    band = np.empty((min(band_height, height), width, 4), dtype)
+    try:
+        for band_y in range(0, height, band_height):
+            band_h = min(band_height, height - band_y)
+            band_pixels = band[:band_h]
+            store_pixels(band_pixels, bg_color)
+
+            # load the images that start in this band
+            while next_img < len(order) and imgs_rect[order[next_img]][1] < band_y + band_h:
+                i = order[next_img]
+                x, y, w, h = imgs_rect[i][:4]
+                key = tile_key(i) if tile_cache else None
+                tile = tile_cache.get(key) if key else None
+                if tile is None:
+                    img_pixels, scratch = read_pixels(i, scratch)
+                    tile = np.empty((h, w, 4), dtype)
+                    resample_into(img_pixels, imgs_rect[i], filter_type, tile)
+                    if key:
+                        tile_cache.put(key, tile)
+                # Blender pixels start at the bottom row, the PNG at the top
+                tiles[i] = tile[::-1]
+                next_img += 1
+                yield
+
+            for i, tile in list(tiles.items()):
+                x, y, w, h = imgs_rect[i][:4]
+                top = max(y, band_y)
+                bottom = min(y + h, band_y + band_h)
+                band_pixels[top-band_y: bottom-band_y, x: x+w] = tile[top-y: bottom-y]
+
+                # release images that end in this band
+                if y + h <= band_y + band_h:
+                    del tiles[i]
+
+            writer.write_rows(band_pixels)
+    except BaseException:
+        # a cancelled or failed pack doesn't leave a broken file behind
+        writer.close()
+        os.remove(filepath)
+        raise
+    writer.close()
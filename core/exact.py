@@ -0,0 +1,177 @@
+import time
+from math import ceil
+
+from .auto_tune import auto_pack
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+# Number of search nodes between two checks of the time budget
+CHECK_INTERVAL = 1024
+# Search nodes each box gets in the first round, every next round gets four times as many
+FIRST_ROUND_NODES = 256
+
+
+def fit_in_box(sizes, box_w, box_h, allow_rotation, deadline, max_nodes=None):
+    """Searches a placement of all (w, h) sizes in a box with a depth first search over the bottom
+    left placements. The lowest gap of the skyline is either filled with a size at its left or
+    raised to its lowest neighbour, wasting the area below it. Branches that waste more than the
+    box has to spare are cut. Returns the top left corner and rotation of every size, None when
+    they don't fit, raises SearchTimeout when the deadline passes or the search visits more than
+    max_nodes placements"""
+    slack = box_w * box_h - sum(w * h for w, h in sizes)
+    if slack < 0:
+        return None
+
+    # sizes with the same dimensions are interchangeable, so only one of them is tried per gap
+    groups = {}
+    for i, (w, h) in enumerate(sizes):
+        groups.setdefault((w, h), []).append(i)
+    # taller sizes first keeps the skyline flat, like the skyline packer
+    shapes = sorted(groups, key=lambda size: (-size[1], -size[0]))
+
+    imgs_pos = [None] * len(sizes)
+    imgs_rotated = [False] * len(sizes)
+    nodes = 0
+
+    def search(skyline, wasted):
+        nonlocal nodes
+        nodes += 1
+        if nodes == max_nodes or (nodes % CHECK_INTERVAL == 0 and time.perf_counter() > deadline):
+            raise SearchTimeout()
+
+        # skyline segments are [x, level, width], the lowest gap is filled first
+        gap = min(range(len(skyline)), key=lambda i: (skyline[i][1], skyline[i][0]))
+        x, y, gap_w = skyline[gap]
+
+        # the part of the gap the remaining widths can't fill is raised at least to its lowest
+        # neighbour or by the lowest remaining size, so that area is wasted for sure
+        reachable = 1
+        min_h = None
+        for w, h in shapes:
+            for _ in groups[(w, h)]:
+                reachable |= (reachable << w) | ((reachable << h) if allow_rotation else 0)
+                min_h = min(min_h or h, min(w, h) if allow_rotation else h)
+        if min_h is None:
+            return True
+        filled = (reachable & ((2 << gap_w) - 1)).bit_length() - 1
+        neighbours = [skyline[i][1] for i in (gap - 1, gap + 1) if 0 <= i < len(skyline)]
+        raise_h = min([min_h] + [level - y for level in neighbours])
+        if wasted + (gap_w - filled) * raise_h > slack:
+            return False
+
+        for w, h in shapes:
+            indices = groups[(w, h)]
+            if not indices:
+                continue
+            orientations = [(w, h, False)]
+            if allow_rotation and w != h:
+                orientations.append((h, w, True))
+
+            for place_w, place_h, rotated in orientations:
+                if place_w > gap_w or y + place_h > box_h:
+                    continue
+                i = indices.pop()
+                imgs_pos[i] = (x, y)
+                imgs_rotated[i] = rotated
+
+                new_skyline = skyline[:gap] + [[x, y + place_h, place_w]]
+                if place_w < gap_w:
+                    new_skyline.append([x + place_w, y, gap_w - place_w])
+                new_skyline += skyline[gap + 1:]
+                if search(merge_segments(new_skyline), wasted):
+                    return True
+                indices.append(i)
+
+        # leave the gap empty up to its lowest neighbour
+        if not neighbours:
+            return False
+        level = min(neighbours)
+        wasted += gap_w * (level - y)
+        if wasted > slack:
+            return False
+
+        new_skyline = skyline[:gap] + [[x, level, gap_w]] + skyline[gap + 1:]
+        return search(merge_segments(new_skyline), wasted)
+
+    if search([[0, 0, box_w]], 0):
+        return imgs_pos, imgs_rotated
+    return None
+
+
+def merge_segments(skyline):
+    """Joins neighbouring skyline segments at the same level"""
+    merged = [skyline[0]]
+    for x, y, w in skyline[1:]:
+        if y == merged[-1][1]:
+            merged[-1] = [merged[-1][0], y, merged[-1][2] + w]
+        else:
+            merged.append([x, y, w])
+    return merged
+
+
+def pack_exact(sizes, bin_width, allow_rotation=False, time_budget=2.0):
+    """Packs (w, h) sizes in the smallest box, with a width to height ratio within a factor two of a
+    strip of bin_width. Starts from the densest heuristic layout of auto_pack and tries every
+    smaller box from the smallest area up, the first box that fits is the smallest. When the
+    time_budget in seconds runs out the smallest layout found so far is used.
+    Returns the top left corner of every size in the given order, the used width and height and
+    whether each size is rotated"""
+    deadline = time.perf_counter() + time_budget
+    total_area = sum(w * h for w, h in sizes)
+    ratio = bin_width * bin_width / max(1, total_area)
+
+    # a quarter of the time goes to the heuristics, which gives the box to beat
+    _, _, imgs_pos, max_w, max_h, imgs_rotated = auto_pack(
+        sizes, bin_width, allow_rotation, 0, 0, time_budget / 4)
+    best_area = max_w * max_h
+
+    if allow_rotation:
+        min_w = max(min(size) for size in sizes)
+        min_h = min_w
+    else:
+        min_w = max(w for w, h in sizes)
+        min_h = max(h for w, h in sizes)
+
+    # per width the lowest box that isn't ruled out yet
+    boxes = {}
+    for box_w in range(min_w, ceil(best_area / min_h)):
+        box_h = max(min_h, ceil(total_area / box_w), ceil(box_w / (2 * ratio)))
+        if box_w * box_h < best_area and box_h * ratio <= 2 * box_w:
+            boxes[box_w] = box_h
+
+    # Fitting a box close to the best area is quick, while proving that a box is too small can take
+    # long. So the largest boxes go first and every round gives each box more search nodes, boxes
+    # that are too small move up and boxes that fit make every larger box pointless
+    max_nodes = FIRST_ROUND_NODES
+    while boxes and time.perf_counter() < deadline:
+        for box_w, box_h in sorted(boxes.items(), key=lambda box: -box[0] * box[1]):
+            if box_w * box_h >= best_area:
+                del boxes[box_w]
+                continue
+            try:
+                placement = fit_in_box(sizes, box_w, box_h, allow_rotation, deadline, max_nodes)
+            except SearchTimeout:
+                if time.perf_counter() > deadline:
+                    break
+                continue
+
+            if placement is None:
+                # no lower box of this width fits either, so the next one is one pixel higher
+                box_h += 1
+                if box_w * box_h < best_area and box_h * ratio <= 2 * box_w:
+                    boxes[box_w] = box_h
+                else:
+                    del boxes[box_w]
+            else:
+                imgs_pos, imgs_rotated = placement
+                best_area = box_w * box_h
+                del boxes[box_w]
+        max_nodes *= 4
+
+    # the box may be larger than the layout that fills it
+    max_w = max(x + (h if rotated else w) for (x, y), (w, h), rotated in zip(imgs_pos, sizes, imgs_rotated))
+    max_h = max(y + (w if rotated else h) for (x, y), (w, h), rotated in zip(imgs_pos, sizes, imgs_rotated))
+    return imgs_pos, max_w, max_h, imgs_rotated
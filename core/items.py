@@ -0,0 +1,61 @@
+import numpy as np
+
+
+# One row per image. Before packing w and h are the size of the source image, the packed items
+# hold the content rectangle of the image in the layout: the top left x and y, the size w and h
+# after scaling and rotation and the page it is placed on
+ITEM_DTYPE = np.dtype([
+    ("id", "i8"),
+    ("w", "i8"),
+    ("h", "i8"),
+    ("x", "i8"),
+    ("y", "i8"),
+    ("rotated", "?"),
+    ("page", "i4"),
+])
+
+
+def make_items(sizes, ids=None):
+    """Items of the (w, h) source sizes, the ids are the index of every size by default"""
+    items = np.zeros(len(sizes), ITEM_DTYPE)
+    items["id"] = np.arange(len(sizes)) if ids is None else ids
+    if len(sizes):
+        sizes = np.asarray(sizes, "i8").reshape(-1, 2)
+        items["w"] = sizes[:, 0]
+        items["h"] = sizes[:, 1]
+    return items
+
+
+def item_sizes(items):
+    """(w, h) of every item as ints"""
+    return list(zip(items["w"].tolist(), items["h"].tolist()))
+
+
+def item_rect(item):
+    """(x, y, w, h, rotated) of a single item as Python values"""
+    return int(item["x"]), int(item["y"]), int(item["w"]), int(item["h"]), bool(item["rotated"])
+
+
+def item_rects(items):
+    """(x, y, w, h, rotated) of every item as Python values"""
+    return list(zip(items["x"].tolist(), items["y"].tolist(), items["w"].tolist(),
+                    items["h"].tolist(), items["rotated"].tolist()))
+
+
+def place_items(items, imgs_rect, page=0):
+    """Copy of the items placed at the (x, y, w, h, rotated) rectangles on the given page"""
+    placed = items.copy()
+    if len(imgs_rect):
+        rects = np.array([rect[:4] for rect in imgs_rect], "i8")
+        placed["x"] = rects[:, 0]
+        placed["y"] = rects[:, 1]
+        placed["w"] = rects[:, 2]
+        placed["h"] = rects[:, 3]
+        placed["rotated"] = [rect[4] for rect in imgs_rect]
+    placed["page"] = page
+    return placed
+
+
+def items_on_page(items, page):
+    """The items placed on a page, in the order of the items"""
+    return items[items["page"] == page]
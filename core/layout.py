@@ -0,0 +1,442 @@
+import heapq
+import numpy as np
+
+from math import ceil, floor, sqrt
+from operator import mod
+from .items import item_sizes, place_items
+from .maxrects import pack_maxrects
+from .skyline import pack_skyline
+from .shelf import pack_shelves
+from .bin_search import search_bin_size
+from .auto_tune import auto_pack
+from .exact import pack_exact
+from .row_breaking import balanced_rows, min_row_length
+
+
+# The layout modes take an items array with the source sizes and the layout settings, any object
+# with the attributes of the ImagePacker properties, and return the packed size and the placed items
+
+
+class ItemTooLargeError(ValueError):
+    """An item doesn't fit in a page of the maximal atlas size on its own"""
+    def __init__(self, item_id, max_size):
+        super().__init__("Image {} is larger than the maximal atlas size of {}px".format(item_id, max_size))
+        self.item_id = item_id
+        self.max_size = max_size
+
+
+def median_of_list(n_list):
+    n_list.sort()
+    mid = len(n_list) // 2
+    return (n_list[mid] + n_list[~mid]) / 2
+
+
+def get_square_imgs_pos(amount, size, squares):
+    imgs_pos = []
+    for i in range(amount):
+        x = mod(i, squares) * size[0]
+        y = floor(i / squares) * size[1]
+        imgs_pos.append((x, y))
+    return imgs_pos
+
+
+def padded_imgs_rect(imgs_pos, sizes, padding, imgs_rotated=None):
+    """Content rectangles (x, y, w, h, rotated) of padded tiles placed at imgs_pos,
+    the size of rotated tiles is swapped"""
+    if imgs_rotated is None:
+        imgs_rotated = [False] * len(sizes)
+
+    imgs_rect = []
+    for (x, y), (w, h), rotated in zip(imgs_pos, sizes, imgs_rotated):
+        if rotated:
+            w, h = h, w
+        imgs_rect.append((x + padding, y + padding, w - 2*padding, h - 2*padding, rotated))
+    return imgs_rect
+
+
+def med_ratio_from_size(sizes):
+    ratios = []
+    for size in sizes:
+        ratios.append(size[0] / size[1])
+    return median_of_list(ratios)
+
+def areas_from_size(sizes):
+    areas = []
+    for size in sizes:
+        areas.append(size[0] * size[1])
+    return areas
+
+
+def img_side_length(items, settings):
+    mode = settings.side_mode
+    row_mode = settings.side_switch == "width"
+
+    total_side = (items["h"] if row_mode else items["w"]).tolist()
+
+    # set side length based on side mode
+    if "med" in mode:
+        side = ceil( median_of_list(total_side))
+    elif "avg" in mode:
+        side = ceil( sum(total_side) / len(total_side))
+    elif "min" in mode:
+        side = min(total_side)
+    elif "max" in mode:
+        side = max(total_side)
+    else:
+        side = settings.side_length
+
+    return side
+
+
+def SquarePacking(items, settings, side=None):
+    padding = settings.padding
+
+    side = side or img_side_length(items, settings)
+    squares = ceil( sqrt( len(items)))
+    tile_side = side + 2*padding
+    max_w = tile_side * squares
+
+    imgs_pos = get_square_imgs_pos(len(items), (tile_side, tile_side), squares)
+    imgs_rect = []
+    for (w, h), (x, y) in zip(item_sizes(items), imgs_pos):
+        x += padding
+        y += padding
+
+        if settings.keep_aspect_ratio:
+            scale_factor = min(side / w, side / h)
+            # very thin images keep at least a pixel
+            new_size = [max(1, floor(w * scale_factor)), max(1, floor(h * scale_factor))]
+            fill_padding = [side - new_size[0], side - new_size[1]]
+
+            # center the image in the fill padding
+            x += floor(fill_padding[0] / 2)
+            y += ceil(fill_padding[1] / 2)
+            imgs_rect.append((x, y, new_size[0], new_size[1], False))
+        else:
+            imgs_rect.append((x, y, side, side, False))
+
+    return (max_w, max_w), place_items(items, imgs_rect)
+
+
+def place_balanced_rows(sizes, side, padding, max_length, justify):
+    """Places (length, side) sizes in rows broken by balanced_rows, in row orientation.
+    With justify every row is scaled to fill the longest row exactly"""
+    rows, row_length = balanced_rows([length for length, _ in sizes], max_length)
+    imgs_rect = [None] * len(sizes)
+
+    y = 0
+    for start, end in rows:
+        paddings = 2 * padding * (end - start)
+        content_length = sum(sizes[i][0] for i in range(start, end)) - paddings
+        scale = (row_length - paddings) / content_length if justify else 1
+        row_side = round((side - 2*padding) * scale) + 2*padding
+
+        # rounding the running total spreads the rounding errors over the row
+        x = 0
+        content_x = 0
+        for count, i in enumerate(range(start, end), 1):
+            content_x += sizes[i][0] - 2*padding
+            end_x = round(content_x * scale) + 2*padding*count
+            imgs_rect[i] = (x + padding, y + padding, end_x - x - 2*padding, row_side - 2*padding, False)
+            x = end_x
+        y += row_side
+
+    return (row_length, y), imgs_rect
+
+
+def RowPacking(items, settings, row_mode=True, side=None):
+    padding = settings.padding
+
+    side = side or img_side_length(items, settings)
+
+    # padded sizes based on side and img aspect ratio
+    sizes = []
+    for img_w, img_h in item_sizes(items):
+        if row_mode:
+            w = ceil(img_w * (side / img_h))
+            h = side
+        else:
+            w = side
+            h = ceil((img_h * side) / img_w)
+
+        w += 2*padding
+        h += 2*padding
+        sizes.append((w, h))
+    side += 2*padding
+
+    match settings.aspect_ratio_mode:
+        case "med":
+            ratio = med_ratio_from_size(sizes)
+        case "custom":
+            ratio = settings.aspect_ratio_width / settings.aspect_ratio_height
+
+    area = sum(areas_from_size(sizes))
+    threshold = ceil( sqrt(area* ratio))
+
+    if settings.balanced_rows:
+        if row_mode:
+            size, imgs_rect = place_balanced_rows(sizes, side, padding, threshold, settings.justify_rows)
+            return size, place_items(items, imgs_rect)
+
+        # columns are rows on their side, limited to the amount of columns that fit the threshold
+        heights = [(h, w) for w, h in sizes]
+        max_length = min_row_length([h for h, _ in heights], max(1, threshold // side))
+        (max_h, max_w), imgs_rect = place_balanced_rows(
+            heights, side, padding, max_length, settings.justify_rows)
+        return (max_w, max_h), place_items(items, [(y, x, h, w, False) for x, y, w, h, _ in imgs_rect])
+
+    # Initialize the list of image positions
+    imgs_pos = []
+
+    # Iterate through the scaled sizes
+    if row_mode:
+        # Initialize the current position and the maximum width and height
+        x = y = 0
+        max_w = 0
+        for w, h in sizes:
+            # Check if the img fits within the current position
+            if x + w > threshold:
+                # The img doesn't fit, so start a new line
+                x = 0
+                y += h
+            # The img fits, so place it at the current position
+            imgs_pos.append((x, y))
+            x += w
+            max_w = max(max_w, x)
+        max_h = max(imgs_pos, key=lambda x: x[1])[1] + h
+
+    # Keep track of img heights per row to place the next row on.
+    # Crop to last row max height to remove empty space.
+    else:
+        # Calculate the number of images per row
+        sides = max(1, int((threshold - threshold % side) / side))
+
+        if settings.shortest_column:
+            # Masonry: every image goes on top of the currently shortest column
+            order = range(len(sizes))
+            if settings.sort_by_height:
+                order = sorted(order, key=lambda i: -sizes[i][1])
+
+            imgs_pos = [None] * len(sizes)
+            heights = [(0, col_index) for col_index in range(sides)]
+            for i in order:
+                height, col_index = heapq.heappop(heights)
+                imgs_pos[i] = (col_index * side, height)
+                heapq.heappush(heights, (height + sizes[i][1], col_index))
+
+            max_w = side * sides
+            max_h = max(heights)[0]
+        else:
+            heights = [0] * sides
+            for i, (w, h) in enumerate(sizes):
+                col_index = i % sides
+                width = col_index * side
+                height = heights[col_index]
+
+                imgs_pos.append((width, height))
+                heights[col_index] += h
+
+            max_w = side * sides
+            max_h = max(heights)
+
+    imgs_rect = padded_imgs_rect(imgs_pos, sizes, padding)
+    return (max_w, max_h), place_items(items, imgs_rect)
+
+
+def NextFitPacking(items, settings, page_size=None):
+    padding = settings.padding
+
+    sizes = [(w + 2*padding, h + 2*padding) for w, h in item_sizes(items)]
+
+    match settings.aspect_ratio_mode:
+        case "med":
+            ratio = med_ratio_from_size(sizes)
+        case "custom":
+            ratio = settings.aspect_ratio_width / settings.aspect_ratio_height
+
+    # Amount of area needed to place all pixel data + 50% empty space (cropped later)
+    total_area = sum(areas_from_size(sizes))
+    area = ceil(total_area * 1.5)
+
+    max_height = ceil(sqrt(area / ratio))
+    max_width = ceil(area / max_height)
+
+    return strip_layout(items, sizes, max_width, ratio, settings, lambda bin_width, max_height:
+                        pack_shelves(sizes, bin_width, settings.shelf_mode,
+                                     settings.allow_rotation, max_height), page_size)
+
+
+def strip_layout(items, sizes, bin_width, ratio, settings, pack, page_size=None):
+    """Size and placed items of padded sizes packed in a strip of bin_width,
+    with optimize_size the width that gives the smallest atlas is searched instead.
+    With a page_size the sizes are packed in a square page of that size, None if they don't fit"""
+    if page_size:
+        layout = pack(page_size, page_size)
+        if layout is None:
+            return None
+        imgs_pos, max_w, max_h, imgs_rotated = layout
+        size = (max_w, max_h)
+    elif settings.optimize_size:
+        size, imgs_pos, imgs_rotated = search_bin_size(
+            pack, sizes, bin_width, ratio, settings.aspect_ratio_mode == "custom",
+            settings.power_of_two, settings.max_size)
+    else:
+        imgs_pos, max_w, max_h, imgs_rotated = pack(bin_width, None)
+        size = (max_w, max_h)
+
+    imgs_rect = padded_imgs_rect(imgs_pos, sizes, settings.padding, imgs_rotated)
+    return size, place_items(items, imgs_rect)
+
+
+def free_sizes(items, settings):
+    """Padded sizes of the unscaled images, the aspect ratio and the width of the strip they are
+    packed in by the free-form packers"""
+    padding = settings.padding
+
+    sizes = [(w + 2*padding, h + 2*padding) for w, h in item_sizes(items)]
+
+    match settings.aspect_ratio_mode:
+        case "med":
+            ratio = med_ratio_from_size(sizes)
+        case "custom":
+            ratio = settings.aspect_ratio_width / settings.aspect_ratio_height
+
+    # the gaps are filled, so the width is based on the exact area of the images
+    total_area = sum(areas_from_size(sizes))
+    bin_width = ceil(sqrt(total_area * ratio))
+    return sizes, ratio, bin_width
+
+
+def FreePacking(items, settings, pack_func, page_size=None):
+    """Packs the unscaled images with a free-form packer that fills a strip of a fixed width"""
+    sizes, ratio, bin_width = free_sizes(items, settings)
+    return strip_layout(items, sizes, bin_width, ratio, settings, lambda bin_width, max_height:
+                        pack_func(sizes, bin_width, max_height), page_size)
+
+
+def MaxRectsPacking(items, settings, page_size=None):
+    return FreePacking(items, settings, lambda sizes, bin_width, max_height:
+                       pack_maxrects(sizes, bin_width, settings.maxrects_heuristic,
+                                     settings.allow_rotation, max_height), page_size)
+
+
+def SkylinePacking(items, settings, page_size=None):
+    return FreePacking(items, settings, lambda sizes, bin_width, max_height:
+                       pack_skyline(sizes, bin_width, settings.skyline_waste_map,
+                                    settings.allow_rotation, max_height), page_size)
+
+
+def AutoPacking(items, settings, workers=1):
+    """Packs the images with every free-form packer, heuristic and order in a process pool and
+    keeps the layout with the highest occupancy"""
+    sizes, ratio, bin_width = free_sizes(items, settings)
+    _, _, imgs_pos, max_w, max_h, imgs_rotated = auto_pack(
+        sizes, bin_width, settings.allow_rotation, settings.auto_seeds,
+        settings.random_seed, settings.auto_time_budget, workers)
+
+    imgs_rect = padded_imgs_rect(imgs_pos, sizes, settings.padding, imgs_rotated)
+    return (max_w, max_h), place_items(items, imgs_rect)
+
+
+def ExactPacking(items, settings):
+    """Searches the smallest layout of the unscaled images within the time budget, for small sets"""
+    sizes, ratio, bin_width = free_sizes(items, settings)
+    imgs_pos, max_w, max_h, imgs_rotated = pack_exact(
+        sizes, bin_width, settings.allow_rotation, settings.auto_time_budget)
+
+    imgs_rect = padded_imgs_rect(imgs_pos, sizes, settings.padding, imgs_rotated)
+    return (max_w, max_h), place_items(items, imgs_rect)
+
+
+def compute_packing_layout(items, settings, packing_mode=None, side=None, page_size=None, workers=1):
+    """Packed image size and the placed items for the packing mode, the selected one by default.
+    The modes that scale the images use side when given, the free-form modes pack in a square page
+    of page_size when given and return None if it's too small. Auto Packing uses workers processes"""
+    match packing_mode or settings.packing_mode:
+        case "square_packing":
+            return SquarePacking(items, settings, side)
+        case "row_packing":
+            return RowPacking(items, settings, True, side)
+        case "col_packing":
+            return RowPacking(items, settings, False, side)
+        case "nextfit_packing":
+            return NextFitPacking(items, settings, page_size)
+        case "maxrects_packing":
+            return MaxRectsPacking(items, settings, page_size)
+        case "skyline_packing":
+            return SkylinePacking(items, settings, page_size)
+        case "auto_packing":
+            return AutoPacking(items, settings, workers)
+        case "exact_packing":
+            return ExactPacking(items, settings)
+
+
+def split_pages(items, settings, max_size, packing_mode=None, workers=1):
+    """Splits the items in pages of the most items in order whose layout fits in max_size,
+    returns the size and the placed items of every page"""
+    # every page scales the images to the side of all images, like a single packed image would
+    side = None
+    if (packing_mode or settings.packing_mode) in ("square_packing", "row_packing", "col_packing"):
+        side = img_side_length(items, settings)
+
+    layouts = {}
+
+    def fits(count):
+        layout = compute_packing_layout(
+            items[start: start+count], settings, packing_mode, side, max_size, workers)
+        if layout is None or max(layout[0]) > max_size:
+            return False
+        layouts[count] = layout
+        return True
+
+    pages = []
+    start = 0
+    while start < len(items):
+        left = len(items) - start
+        layouts.clear()
+        if not fits(1):
+            raise ItemTooLargeError(int(items[start]["id"]), max_size)
+
+        # double the amount of items until they don't fit, then search the most that fit
+        low = 1
+        high = 2
+        while high <= left and fits(high):
+            low = high
+            high *= 2
+        high = min(high, left + 1)
+        while high - low > 1:
+            count = (low + high) // 2
+            if fits(count):
+                low = count
+            else:
+                high = count
+
+        pages.append(layouts[low])
+        start += low
+    return pages
+
+
+def pack_pages(items, settings, workers=1):
+    """Page sizes and the placed items with the page they are on, a single page unless the layout is
+    larger than the maximal atlas size. Auto and Exact Packing take too long to try every page size,
+    so their pages are split by Skyline Packing and only packed by the selected mode when it still fits"""
+    max_size = settings.max_atlas_size
+    if not max_size:
+        size, placed = compute_packing_layout(items, settings, workers=workers)
+        return [size], placed
+
+    if settings.packing_mode in ("auto_packing", "exact_packing"):
+        pages = split_pages(items, settings, max_size, "skyline_packing", workers)
+        start = 0
+        for i, (size, page_items) in enumerate(pages):
+            # the placed items hold the layout size, so the page is packed from the source items
+            page_layout = compute_packing_layout(items[start: start+len(page_items)], settings, workers=workers)
+            if max(page_layout[0]) <= max_size:
+                pages[i] = page_layout
+            start += len(page_items)
+    else:
+        pages = split_pages(items, settings, max_size, workers=workers)
+
+    for page, (size, page_items) in enumerate(pages):
+        page_items["page"] = page
+    return [size for size, _ in pages], np.concatenate([page_items for _, page_items in pages])
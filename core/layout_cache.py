@@ -0,0 +1,30 @@
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Small least recently used cache, the oldest entry is evicted once max_size is reached"""
+
+    def __init__(self, max_size=32):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+    def get(self, key, default=None):
+        if key not in self.entries:
+            return default
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
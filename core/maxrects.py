@@ -0,0 +1,165 @@
+import numpy as np
+
+
+def column_rects(x, y, w, h):
+    """(n, 4) array of rectangles from columns that may be scalars"""
+    return np.column_stack(np.broadcast_arrays(x, y, w, h)).reshape(-1, 4)
+
+
+def contained_in(rects, others):
+    """(len(rects), len(others)) matrix whether each rect lies inside each other rect"""
+    a = rects[:, None, :]
+    b = others[None, :, :]
+    return ((a[..., 0] >= b[..., 0]) & (a[..., 1] >= b[..., 1])
+            & (a[..., 0] + a[..., 2] <= b[..., 0] + b[..., 2])
+            & (a[..., 1] + a[..., 3] <= b[..., 1] + b[..., 3]))
+
+
+def split_free_rects(free_rects, rect):
+    """Splits every free rectangle overlapped by rect into its maximal leftover parts and prunes
+    the new parts that lie inside another free rectangle"""
+    x, y, w, h = rect
+    fx, fy, fw, fh = free_rects.T
+    hit = (x < fx + fw) & (x + w > fx) & (y < fy + fh) & (y + h > fy)
+    if not hit.any():
+        return free_rects
+
+    keep = free_rects[~hit]
+    fx, fy, fw, fh = free_rects[hit].T
+
+    left = x > fx
+    right = x + w < fx + fw
+    top = y > fy
+    bottom = y + h < fy + fh
+    new_rects = np.concatenate([
+        column_rects(fx[left], fy[left], x - fx[left], fh[left]),
+        column_rects(x + w, fy[right], fx[right] + fw[right] - (x + w), fh[right]),
+        column_rects(fx[top], fy[top], fw[top], y - fy[top]),
+        column_rects(fx[bottom], y + h, fw[bottom], fy[bottom] + fh[bottom] - (y + h)),
+    ])
+
+    # Parts of a split rect can't contain untouched free rects, so only the new parts are pruned
+    if len(keep):
+        new_rects = new_rects[~contained_in(new_rects, keep).any(axis=1)]
+    inside = contained_in(new_rects, new_rects)
+    np.fill_diagonal(inside, False)
+    # of two identical rects the first one is kept
+    duplicate = inside & inside.T
+    inside &= ~np.triu(duplicate)
+    new_rects = new_rects[~inside.any(axis=1)]
+
+    return np.concatenate([keep, new_rects])
+
+
+def contact_lengths(rects, w, h, placed, bin_width):
+    """Length of the edges of (x, y, w, h) candidates that touch placed rects or the bin sides"""
+    # only placed rects touching the area of the candidates can add contact
+    left, top = rects[:, :2].min(axis=0)
+    right = rects[:, 0].max() + w
+    bottom = rects[:, 1].max() + h
+    near = ((placed[:, 0] <= right) & (placed[:, 0] + placed[:, 2] >= left)
+            & (placed[:, 1] <= bottom) & (placed[:, 1] + placed[:, 3] >= top))
+    placed = placed[near]
+
+    x = rects[:, 0, None]
+    y = rects[:, 1, None]
+    px, py, pw, ph = (placed[None, :, i] for i in range(4))
+
+    vertical = (px + pw == x) | (px == x + w)
+    overlap_y = np.maximum(0, np.minimum(y + h, py + ph) - np.maximum(y, py))
+    horizontal = (py + ph == y) | (py == y + h)
+    overlap_x = np.maximum(0, np.minimum(x + w, px + pw) - np.maximum(x, px))
+    contact = (vertical * overlap_y + horizontal * overlap_x).sum(axis=1)
+
+    contact += (rects[:, 0] == 0) * h + (rects[:, 0] + w == bin_width) * h + (rects[:, 1] == 0) * w
+    return contact
+
+
+# Amount of bottom-left most candidates the contact point heuristic measures the contact of
+CONTACT_CANDIDATES = 64
+
+
+def score_rects(rects, w, h, heuristic, placed, bin_width):
+    """Primary and secondary score of placing a (w, h) rect in each free rect, lower is better"""
+    leftover_w = rects[:, 2] - w
+    leftover_h = rects[:, 3] - h
+    short_side = np.minimum(leftover_w, leftover_h)
+    long_side = np.maximum(leftover_w, leftover_h)
+
+    match heuristic:
+        case "short_side":
+            return short_side, long_side
+        case "area":
+            return rects[:, 2] * rects[:, 3] - w * h, short_side
+        case "bottom_left":
+            return rects[:, 1] + h, rects[:, 0]
+        case "contact_point":
+            # The strip has no bottom, so positions that make the strip taller are only used
+            # when nothing else fits, otherwise hugging the sides would stack everything
+            used_h = (placed[:, 1] + placed[:, 3]).max(initial=0)
+            grows = np.maximum(rects[:, 1] + h - used_h, 0)
+            shortlist = np.lexsort((rects[:, 0], rects[:, 1] + h, grows))[:CONTACT_CANDIDATES]
+
+            contact = np.zeros(len(rects), dtype=np.int64)
+            contact[shortlist] = contact_lengths(rects[shortlist], w, h, placed, bin_width)
+            # candidates outside the shortlist never win
+            unlisted = np.ones(len(rects), dtype=bool)
+            unlisted[shortlist] = False
+            return grows + unlisted * (grows.max(initial=0) + 1), -contact
+
+
+def orientations(w, h, allow_rotation):
+    """(w, h, rotated) of every way a rect may be placed, squares are never rotated"""
+    if allow_rotation and w != h:
+        return [(w, h, False), (h, w, True)]
+    return [(w, h, False)]
+
+
+def pack_maxrects(sizes, bin_width, heuristic="short_side", allow_rotation=False, max_height=None,
+                  sort=True):
+    """Packs (w, h) sizes in a strip of bin_width with the MaxRects algorithm.
+    With allow_rotation every size is also scored turned 90 degrees, without sort the sizes are
+    placed in the given order.
+    Returns the top left corner of every size in the given order, the used width and height
+    and whether each size is rotated, or None when the sizes don't fit in max_height"""
+    sizes = np.asarray(sizes, dtype=np.int64).reshape(-1, 2)
+    bin_width = max(int(bin_width), int(sizes[:, 0].max(initial=0)))
+    # The strip can always fit every rect stacked on top of each other
+    bin_height = int(sizes.max(axis=1).sum() if allow_rotation else sizes[:, 1].sum())
+    if max_height is not None:
+        bin_height = min(bin_height, int(max_height))
+
+    free_rects = np.array([[0, 0, bin_width, bin_height]], dtype=np.int64)
+    placed = np.zeros((len(sizes), 4), dtype=np.int64)
+    imgs_rotated = [False] * len(sizes)
+
+    # larger rects first, fills the gaps with the smaller ones
+    if sort:
+        order = np.lexsort((-sizes.min(axis=1), -sizes.max(axis=1)))
+    else:
+        order = np.arange(len(sizes))
+    for count, i in enumerate(order):
+        best = None
+        for w, h, rotated in orientations(*sizes[i], allow_rotation):
+            candidates = free_rects[(free_rects[:, 2] >= w) & (free_rects[:, 3] >= h)]
+            if not len(candidates):
+                continue
+            primary, secondary = score_rects(candidates, w, h, heuristic, placed[:count], bin_width)
+            k = np.lexsort((secondary, primary))[0]
+            score = (primary[k], secondary[k])
+            if best is None or score < best[0]:
+                best = (score, candidates[k, :2], w, h, rotated)
+        if best is None:
+            return None
+
+        _, (x, y), w, h, imgs_rotated[i] = best
+        placed[count] = x, y, w, h
+        free_rects = split_free_rects(free_rects, (x, y, w, h))
+
+    imgs_pos = [None] * len(sizes)
+    for i, (x, y, w, h) in zip(order, placed):
+        imgs_pos[i] = (int(x), int(y))
+
+    max_w = int((placed[:, 0] + placed[:, 2]).max(initial=0))
+    max_h = int((placed[:, 1] + placed[:, 3]).max(initial=0))
+    return imgs_pos, max_w, max_h, imgs_rotated
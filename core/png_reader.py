@@ -0,0 +1,204 @@
+import struct
+import zlib
+import numpy as np
+
+from math import ceil
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# samples per pixel of every color type: gray, RGB, palette, gray alpha and RGBA
+CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+
+def iter_chunks(file):
+    """Yields the (type, data) of every chunk up to IEND, the file is past the signature"""
+    while True:
+        header = file.read(8)
+        if len(header) < 8:
+            raise ValueError("Truncated PNG file")
+        length, chunk_type = struct.unpack('>I4s', header)
+        data = file.read(length)
+        # the CRC is left unchecked, zlib catches broken image data
+        file.read(4)
+        yield chunk_type, data
+        if chunk_type == b'IEND':
+            return
+
+
+def open_png(filepath):
+    file = open(filepath, 'rb')
+    if file.read(8) != PNG_SIGNATURE:
+        file.close()
+        raise ValueError("{} is not a PNG file".format(filepath))
+    return file
+
+
+def parse_header(data):
+    width, height, bit_depth, color_type, _, _, interlace = struct.unpack('>IIBBBBB', data)
+    return width, height, bit_depth, color_type, interlace
+
+
+def read_png_header(filepath):
+    """(width, height, bit_depth) of a PNG file, without decoding its pixels"""
+    with open_png(filepath) as file:
+        chunk_type, data = next(iter_chunks(file))
+    if chunk_type != b'IHDR':
+        raise ValueError("{} has no PNG header".format(filepath))
+    return parse_header(data)[:3]
+
+
+def unfilter_rows(scanlines, filters, bpp):
+    """Reverses the None, Sub and Up filters one scanline at a time"""
+    height, stride = scanlines.shape
+    out = np.empty((height, stride), np.uint8)
+    prev = np.zeros(stride, np.uint8)
+
+    for y in range(height):
+        line = scanlines[y]
+        match filters[y]:
+            case 0:
+                cur = line
+            case 1:
+                # Sub adds the byte one pixel to the left, which is a running sum per channel
+                padded = np.zeros(ceil(stride / bpp) * bpp, np.uint8)
+                padded[:stride] = line
+                cur = np.cumsum(padded.reshape(-1, bpp), axis=0, dtype=np.uint8).ravel()[:stride]
+            case 2:
+                cur = line + prev
+        out[y] = cur
+        prev = out[y]
+    return out
+
+
+def predict(filter_type, left, up, up_left):
+    """Prediction of the Sub, Up, Average or Paeth filter of int16 bytes, 0 for None"""
+    match filter_type:
+        case 1:
+            return left
+        case 2:
+            return up
+        case 3:
+            return (left + up) >> 1
+        case 4:
+            up_delta = up - up_left
+            left_delta = left - up_left
+            pa = np.abs(up_delta)
+            pb = np.abs(left_delta)
+            pc = np.abs(up_delta + left_delta)
+            return np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, up, up_left))
+    return np.zeros_like(left)
+
+
+def unfilter_diagonals(scanlines, filters, bpp):
+    """Reverses any filter, including Average and Paeth which depend on the unfiltered pixel to the
+    left. A pixel only depends on the pixels left, up and up left of it, so all pixels on an
+    anti-diagonal are unfiltered at once"""
+    height, stride = scanlines.shape
+    columns = ceil(stride / bpp)
+    pixels = np.zeros((height, columns * bpp), np.uint8)
+    pixels[:, :stride] = scanlines
+    pixels = pixels.reshape(height, columns, bpp)
+
+    # Skewed so anti-diagonal d is row d: skewed[d, y] is the pixel at x = d - y. The unfiltered
+    # pixels are offset by 2 diagonals and 1 row, which leaves zeros outside the image
+    filtered = np.zeros((height + columns, height, bpp), np.uint8)
+    out = np.zeros((height + columns + 1, height + 1, bpp), np.uint8)
+    for y in range(height):
+        filtered[y:y + columns, y] = pixels[y]
+
+    uniform = filters[0] if (filters == filters[0]).all() else None
+    rows_of_filter = {filter_type: (filters == filter_type)[:, None]
+                      for filter_type in set(filters.tolist()) - {0}}
+    for d in range(height + columns - 1):
+        y0 = max(0, d - columns + 1)
+        y1 = min(height, d + 1)
+        left = out[d + 1, y0 + 1:y1 + 1].astype(np.int16)
+        up = out[d + 1, y0:y1].astype(np.int16)
+        up_left = out[d, y0:y1].astype(np.int16)
+
+        if uniform is not None:
+            pred = predict(uniform, left, up, up_left)
+        else:
+            pred = np.zeros_like(left)
+            for filter_type, rows in rows_of_filter.items():
+                pred = np.where(rows[y0:y1], predict(filter_type, left, up, up_left), pred)
+        out[d + 2, y0 + 1:y1 + 1] = filtered[d, y0:y1] + pred.astype(np.uint8)
+
+    unskewed = np.empty((height, columns, bpp), np.uint8)
+    for y in range(height):
+        unskewed[y] = out[y + 2:y + 2 + columns, y + 1]
+    return unskewed.reshape(height, -1)[:, :stride]
+
+
+def unfilter_scanlines(scanlines, filters, bpp):
+    """Reverses the filter of every scanline, bpp is the amount of bytes per complete pixel"""
+    unknown = filters[filters > 4]
+    if len(unknown):
+        raise ValueError("Unknown PNG filter type {}".format(unknown[0]))
+    if np.isin(filters, (3, 4)).any():
+        return unfilter_diagonals(scanlines, filters, bpp)
+    return unfilter_rows(scanlines, filters, bpp)
+
+
+def read_png(filepath):
+    """Decodes a non-interlaced PNG file into (h, w, 4) float RGBA pixels in the 0-1 range,
+    with the bottom row first like Blender pixels"""
+    palette = None
+    transparency = None
+    idat = []
+    with open_png(filepath) as file:
+        for chunk_type, data in iter_chunks(file):
+            match chunk_type:
+                case b'IHDR':
+                    width, height, bit_depth, color_type, interlace = parse_header(data)
+                case b'PLTE':
+                    palette = np.frombuffer(data, np.uint8).reshape(-1, 3)
+                case b'tRNS':
+                    transparency = data
+                case b'IDAT':
+                    idat.append(data)
+    if interlace:
+        raise ValueError("{} is interlaced, which isn't supported".format(filepath))
+    if color_type not in CHANNELS:
+        raise ValueError("{} has the unknown color type {}".format(filepath, color_type))
+
+    channels = CHANNELS[color_type]
+    bits_per_pixel = channels * bit_depth
+    stride = ceil(width * bits_per_pixel / 8)
+    try:
+        raw = np.frombuffer(zlib.decompress(b''.join(idat)), np.uint8)
+    except zlib.error as error:
+        raise ValueError("{} has broken image data: {}".format(filepath, error)) from None
+    rows = raw[:height * (stride + 1)].reshape(height, stride + 1)
+    data = unfilter_scanlines(rows[:, 1:], rows[:, 0], max(1, bits_per_pixel // 8))
+
+    # samples as integers, low bit depths are packed several to a byte
+    if bit_depth == 16:
+        samples = data.view('>u2').astype(np.int64)
+    elif bit_depth == 8:
+        samples = data.astype(np.int64)
+    else:
+        bits = np.unpackbits(data, axis=1).reshape(height, -1, bit_depth)
+        samples = bits.dot(1 << np.arange(bit_depth - 1, -1, -1)).astype(np.int64)
+    samples = samples[:, :width * channels].reshape(height, width, channels)
+    max_value = (1 << bit_depth) - 1
+
+    pixels = np.ones((height, width, 4), 'f')
+    if color_type == 3:
+        table = np.full((len(palette), 4), 255, np.uint8)
+        table[:, :3] = palette
+        if transparency is not None:
+            alpha = np.frombuffer(transparency, np.uint8)[:len(palette)]
+            table[:len(alpha), 3] = alpha
+        pixels[...] = table[samples[..., 0]] / 255
+    else:
+        color = samples[..., :3] if color_type in (2, 6) else samples[..., :1]
+        pixels[..., :3] = color / max_value
+        if color_type in (4, 6):
+            pixels[..., 3] = samples[..., -1] / max_value
+        elif transparency is not None:
+            # a single colour is fully transparent
+            key = np.frombuffer(transparency, '>u2')[:color.shape[-1]]
+            pixels[..., 3][(color == key).all(axis=-1)] = 0
+
+    return pixels[::-1]
@@ -0,0 +1,47 @@
+import struct
+import zlib
+import numpy as np
+
+
+class PNGStreamWriter:
+    """Writes an RGBA PNG scanline band by band, so the full image never has to be in memory"""
+
+    def __init__(self, filepath, width, height, bit_depth=8, level=6):
+        self.width = width
+        self.height = height
+        self.bit_depth = bit_depth
+        self.rows_written = 0
+        self.compressor = zlib.compressobj(level)
+        self.file = open(filepath, 'wb')
+
+        self.file.write(b'\x89PNG\r\n\x1a\n')
+        # color type 6 is RGBA
+        self.write_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, bit_depth, 6, 0, 0, 0))
+
+    def write_chunk(self, chunk_type, data):
+        self.file.write(struct.pack('>I', len(data)))
+        self.file.write(chunk_type)
+        self.file.write(data)
+        self.file.write(struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff))
+
+    def write_rows(self, rows):
+        """Appends (n, width, 4) float, half or byte rows in the 0-1 range, ordered from top to bottom"""
+        # scaled in float32, half floats overflow at 65535
+        if self.bit_depth == 16:
+            rows = (np.clip(rows, 0, 1, dtype=np.float32) * 65535 + 0.5).astype('>u2')
+        elif rows.dtype != np.uint8:
+            rows = (np.clip(rows, 0, 1, dtype=np.float32) * 255 + 0.5).astype(np.uint8)
+
+        # every scanline starts with its filter type, 0 means no filter
+        scanlines = np.zeros((rows.shape[0], rows[0].nbytes + 1), np.uint8)
+        scanlines[:, 1:] = rows.reshape(rows.shape[0], -1).view(np.uint8)
+
+        data = self.compressor.compress(scanlines.tobytes())
+        if data:
+            self.write_chunk(b'IDAT', data)
+        self.rows_written += rows.shape[0]
+
+    def close(self):
+        self.write_chunk(b'IDAT', self.compressor.flush())
+        self.write_chunk(b'IEND', b'')
+        self.file.close()
@@ -0,0 +1,137 @@
+import numpy as np
+
+from math import ceil
+
+
+def box_filter(x):
+    return ((x >= -0.5) & (x < 0.5)).astype('f')
+
+
+def bilinear_filter(x):
+    return np.maximum(1.0 - np.abs(x), 0.0)
+
+
+def lanczos_filter(x):
+    return np.where(np.abs(x) < 3.0, np.sinc(x) * np.sinc(x / 3.0), 0.0)
+
+
+# filter function and support radius (in source pixels when upscaling)
+FILTERS = {
+    'box': (box_filter, 0.5),
+    'bilinear': (bilinear_filter, 1.0),
+    'lanczos': (lanczos_filter, 3.0),
+}
+
+# Pixel formats the packed pixels can be composited in
+PIXEL_DTYPES = {
+    'float': np.float32,
+    'half': np.float16,
+    'byte': np.uint8,
+}
+
+# Reduction factor above which the source is first halved with a box filter
+PYRAMID_FACTOR = 3
+
+
+def store_pixels(out, pixels):
+    """Writes float pixels in the 0-1 range into out, converting to the pixel format of out"""
+    if out.dtype == np.uint8:
+        out[...] = np.clip(pixels * 255 + 0.5, 0, 255)
+    else:
+        out[...] = pixels
+
+
+def pixels_to_float(pixels):
+    """Converts pixels of any pixel format back to float32 in the 0-1 range"""
+    if pixels.dtype == np.uint8:
+        return np.multiply(pixels, 1 / 255, dtype='f')
+    return pixels.astype('f', copy=False)
+
+
+def filter_weights(in_size, out_size, filter_type):
+    """Precomputes the source indices and normalized weights of every output pixel along one axis"""
+    filter_func, support = FILTERS[filter_type]
+    scale = in_size / out_size
+    filter_scale = max(scale, 1.0)
+    support *= filter_scale
+
+    # the kernel covers the same amount of source pixels for every output pixel
+    kernel_size = ceil(support) * 2 + 1
+    centers = (np.arange(out_size) + 0.5) * scale
+    left = np.floor(centers - support).astype(int)
+    indices = left[:, None] + np.arange(kernel_size)[None, :]
+
+    weights = filter_func((indices + 0.5 - centers[:, None]) / filter_scale)
+    weights[(indices < 0) | (indices >= in_size)] = 0
+    totals = weights.sum(axis=1, keepdims=True)
+    totals[totals == 0] = 1
+    weights = (weights / totals).astype('f')
+
+    return np.clip(indices, 0, in_size - 1), weights
+
+
+def resample_axis(pixels, out_size, axis, filter_type, out=None):
+    """Separable pass that resizes a (h, w, c) pixel array along a single axis.
+    When out is given the result is accumulated straight into that (view of an) array"""
+    in_size = pixels.shape[axis]
+    if in_size == out_size:
+        if out is None:
+            return pixels
+        out[...] = pixels
+        return out
+
+    indices, weights = filter_weights(in_size, out_size, filter_type)
+    if out is None:
+        out_shape = list(pixels.shape)
+        out_shape[axis] = out_size
+        out = np.zeros(out_shape, 'f')
+    else:
+        out[...] = 0
+
+    # accumulate one kernel tap at a time to keep memory at a single output array
+    for k in range(indices.shape[1]):
+        if axis == 0:
+            out += pixels[indices[:, k]] * weights[:, k, None, None]
+        else:
+            out += pixels[:, indices[:, k]] * weights[None, :, k, None]
+    return out
+
+
+def pyramid_axis(pixels, out_size, axis):
+    """Halves the array along an axis until it is within PYRAMID_FACTOR of out_size"""
+    in_size = pixels.shape[axis]
+    while in_size >= out_size * PYRAMID_FACTOR:
+        in_size = ceil(in_size / 2)
+        pixels = resample_axis(pixels, in_size, axis, 'box')
+    return pixels
+
+
+def resample_pixels(pixels, w, h, filter_type='bilinear', out=None):
+    """Resizes a (h, w, c) pixel array to the new width and height with the given filter.
+    When out is given the last pass writes directly into it, e.g. a region of the packed image"""
+    old_h, old_w = pixels.shape[:2]
+    if (old_w, old_h) == (w, h):
+        if out is None:
+            return pixels
+        store_pixels(out, pixels)
+        return out
+
+    # only float32 outputs can be accumulated into directly
+    if out is not None and out.dtype != np.float32:
+        store_pixels(out, resample_pixels(pixels, w, h, filter_type))
+        return out
+
+    pixels = pixels.astype('f', copy=False)
+
+    # cheap box pre-downsampling for large reductions keeps the kernels small
+    if filter_type != 'box':
+        pixels = pyramid_axis(pixels, w, 1)
+        pixels = pyramid_axis(pixels, h, 0)
+
+    # resize the axis that shrinks the most first to keep the intermediate small
+    if w / pixels.shape[1] <= h / pixels.shape[0]:
+        pixels = resample_axis(pixels, w, 1, filter_type)
+        return resample_axis(pixels, h, 0, filter_type, out)
+    else:
+        pixels = resample_axis(pixels, h, 0, filter_type)
+        return resample_axis(pixels, w, 1, filter_type, out)
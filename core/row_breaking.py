@@ -0,0 +1,59 @@
+from itertools import accumulate
+
+
+def count_rows(lengths, max_length):
+    """Amount of rows the greedy line breaking needs to fit lengths in rows of max_length"""
+    rows = 1
+    row_length = 0
+    for length in lengths:
+        if row_length + length > max_length and row_length > 0:
+            rows += 1
+            row_length = 0
+        row_length += length
+    return rows
+
+
+def min_row_length(lengths, rows):
+    """Smallest row length that fits the lengths in order in at most the amount of rows"""
+    low = max(lengths)
+    high = sum(lengths)
+    while low < high:
+        mid = (low + high) // 2
+        if count_rows(lengths, mid) <= rows:
+            high = mid
+        else:
+            low = mid + 1
+    return low
+
+
+def balanced_rows(lengths, max_length):
+    """Breaks the lengths in order into rows like a justified gallery.
+    The rows use as few rows as the greedy breaking at max_length, the longest row is as short as
+    possible and the rows are as even as possible (minimum raggedness).
+    Returns the (start, end) index of each row and the length of the longest row"""
+    if not lengths:
+        return [], 0
+    row_length = min_row_length(lengths, count_rows(lengths, max_length))
+    prefix = [0] + list(accumulate(lengths))
+
+    # best[i] is the (rows, raggedness) of the best breaking of the first i lengths
+    best = [(0, 0)] + [None] * len(lengths)
+    previous = [0] * (len(lengths) + 1)
+    for end in range(1, len(lengths) + 1):
+        start = end - 1
+        while start >= 0 and prefix[end] - prefix[start] <= row_length:
+            slack = row_length - (prefix[end] - prefix[start])
+            rows, raggedness = best[start]
+            candidate = (rows + 1, raggedness + slack * slack)
+            if best[end] is None or candidate < best[end]:
+                best[end] = candidate
+                previous[end] = start
+            start -= 1
+
+    rows = []
+    end = len(lengths)
+    while end > 0:
+        rows.append((previous[end], end))
+        end = previous[end]
+    rows.reverse()
+    return rows, row_length
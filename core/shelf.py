@@ -0,0 +1,116 @@
+from bisect import bisect_left, insort
+from heapq import heappop, heappush
+
+
+class MaxTree:
+    """Segment tree over a fixed amount of slots that finds the first slot with at least a value"""
+
+    def __init__(self, size):
+        self.size = 1
+        while self.size < size:
+            self.size *= 2
+        self.tree = [-1] * (2 * self.size)
+
+    def update(self, index, value):
+        i = index + self.size
+        self.tree[i] = value
+        i //= 2
+        while i:
+            self.tree[i] = max(self.tree[2 * i], self.tree[2 * i + 1])
+            i //= 2
+
+    def find_first(self, value):
+        """Index of the first slot with a value of at least value, or None"""
+        if self.tree[1] < value:
+            return None
+        i = 1
+        while i < self.size:
+            i = 2 * i if self.tree[2 * i] >= value else 2 * i + 1
+        return i - self.size
+
+
+def pack_shelves(sizes, max_width, shelf_mode="next_fit", allow_rotation=False, max_height=None):
+    """Packs (w, h) sizes on shelves of max_width stacked on top of each other.
+    next_fit keeps the order and only fills the last shelf, first_fit and best_fit sort the
+    sizes on decreasing height and put each size on the first or the fullest shelf it fits on.
+    With allow_rotation sizes taller than wide are laid on their side when they fit the width.
+    Returns the top left corner of every size in the given order, the used width and height
+    and whether each size is rotated, or None when the shelves get taller than max_height"""
+    max_width = max([max_width] + [w for w, h in sizes])
+    imgs_rotated = [allow_rotation and w < h <= max_width for w, h in sizes]
+    sizes = [(h, w) if rotated else (w, h) for (w, h), rotated in zip(sizes, imgs_rotated)]
+    imgs_pos = [None] * len(sizes)
+    max_w = 0
+
+    if shelf_mode == "next_fit":
+        x = y = shelf_h = 0
+        for i, (w, h) in enumerate(sizes):
+            if x + w > max_width:
+                # start a new shelf on top of the current one
+                y += shelf_h
+                x = shelf_h = 0
+            imgs_pos[i] = (x, y)
+            x += w
+            shelf_h = max(shelf_h, h)
+            if max_height is not None and y + shelf_h > max_height:
+                return None
+            max_w = max(max_w, x)
+        return imgs_pos, max_w, y + shelf_h, imgs_rotated
+
+    order = sorted(range(len(sizes)), key=lambda i: -sizes[i][1])
+    # the first size on a shelf is the tallest, so it sets the shelf height
+    shelf_y = []
+    shelf_x = []
+    max_h = 0
+
+    if shelf_mode == "first_fit":
+        free_widths = MaxTree(len(sizes))
+        for i in order:
+            w, h = sizes[i]
+            shelf = free_widths.find_first(w)
+            if shelf is None:
+                shelf = len(shelf_y)
+                shelf_y.append(max_h)
+                shelf_x.append(0)
+                max_h += h
+                if max_height is not None and max_h > max_height:
+                    return None
+            x = shelf_x[shelf]
+            imgs_pos[i] = (x, shelf_y[shelf])
+            shelf_x[shelf] = x + w
+            free_widths.update(shelf, max_width - x - w)
+            max_w = max(max_w, x + w)
+
+    elif shelf_mode == "best_fit":
+        # The distinct free widths are kept sorted, so the smallest free width that fits is found
+        # with bisect. The shelves of every free width are a heap, so ties go to the lowest shelf.
+        # There are at most max_width + 1 distinct free widths however many shelves there are
+        free_widths = []
+        width_shelves = {}
+        for i in order:
+            w, h = sizes[i]
+            index = bisect_left(free_widths, w)
+            if index < len(free_widths):
+                shelves = width_shelves[free_widths[index]]
+                shelf = heappop(shelves)
+                if not shelves:
+                    del width_shelves[free_widths.pop(index)]
+            else:
+                shelf = len(shelf_y)
+                shelf_y.append(max_h)
+                shelf_x.append(0)
+                max_h += h
+                if max_height is not None and max_h > max_height:
+                    return None
+            x = shelf_x[shelf]
+            imgs_pos[i] = (x, shelf_y[shelf])
+            shelf_x[shelf] = x + w
+            free_width = max_width - x - w
+            if free_width in width_shelves:
+                heappush(width_shelves[free_width], shelf)
+            else:
+                width_shelves[free_width] = [shelf]
+                insort(free_widths, free_width)
+            max_w = max(max_w, x + w)
+
+    return imgs_pos, max_w, max_h, imgs_rotated
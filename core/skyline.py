@@ -0,0 +1,112 @@
+import numpy as np
+
+from .maxrects import split_free_rects, score_rects, orientations
+
+
+def skyline_positions(xs, ys, w, bin_width):
+    """Level each (w) wide rect would rest on when placed at the start of every skyline segment"""
+    starts = np.flatnonzero(xs + w <= bin_width)
+    # last segment that is still under the rect
+    ends = np.searchsorted(xs, xs[starts] + w, side='left')
+
+    # max level of the segments [start, end) with a single reduceat
+    indices = np.column_stack([starts, ends]).ravel()
+    levels = np.maximum.reduceat(np.append(ys, 0), indices)[::2]
+    return starts, ends, levels
+
+
+def pack_skyline(sizes, bin_width, use_waste_map=True, allow_rotation=False, max_height=None,
+                 sort=True):
+    """Packs (w, h) sizes in a strip of bin_width with the bottom left skyline algorithm.
+    The skyline is stored as arrays of segments (x, level), so a placement only looks at the
+    segments instead of all placed rects. With use_waste_map the holes left under the skyline are
+    kept as free rects and filled first. With allow_rotation the orientation with the lowest top
+    is used, without sort the sizes are placed in the given order. Returns the top left corner of
+    every size in the given order, the used width and height and whether each size is rotated,
+    or None when the skyline gets taller than max_height"""
+    sizes = np.asarray(sizes, dtype=np.int64).reshape(-1, 2)
+    bin_width = max(int(bin_width), int(sizes[:, 0].max(initial=0)))
+
+    # segment i spans [xs[i], xs[i+1]) and its top is at ys[i], y grows downwards
+    xs = np.zeros(1, dtype=np.int64)
+    ys = np.zeros(1, dtype=np.int64)
+    waste_rects = np.zeros((0, 4), dtype=np.int64)
+    imgs_pos = [None] * len(sizes)
+    imgs_rotated = [False] * len(sizes)
+    max_w = max_h = 0
+
+    # taller rects first keeps the skyline flat, rotated rects are sorted by their longest side
+    if not sort:
+        order = np.arange(len(sizes))
+    elif allow_rotation:
+        order = np.lexsort((-sizes.min(axis=1), -sizes.max(axis=1)))
+    else:
+        order = np.lexsort((-sizes[:, 0], -sizes[:, 1]))
+    for i in order:
+        options = orientations(*(int(v) for v in sizes[i]), allow_rotation)
+
+        if use_waste_map and len(waste_rects):
+            best = None
+            for w, h, rotated in options:
+                fits = (waste_rects[:, 2] >= w) & (waste_rects[:, 3] >= h)
+                if not fits.any():
+                    continue
+                candidates = waste_rects[fits]
+                primary, secondary = score_rects(candidates, w, h, "short_side", None, bin_width)
+                k = np.lexsort((secondary, primary))[0]
+                score = (primary[k], secondary[k])
+                if best is None or score < best[0]:
+                    best = (score, candidates[k, :2], w, h, rotated)
+            if best is not None:
+                _, (x, y), w, h, imgs_rotated[i] = best
+                x, y = int(x), int(y)
+                waste_rects = split_free_rects(waste_rects, (x, y, w, h))
+                imgs_pos[i] = (x, y)
+                continue
+
+        # lowest top first, then leftmost
+        best = None
+        for w, h, rotated in options:
+            if w > bin_width:
+                continue
+            starts, ends, levels = skyline_positions(xs, ys, w, bin_width)
+            k = np.lexsort((xs[starts], levels))[0]
+            score = (int(levels[k]) + h, int(xs[starts[k]]))
+            if best is None or score < best[0]:
+                best = (score, int(starts[k]), int(ends[k]), int(levels[k]), w, h, rotated)
+
+        _, start, end, y, w, h, imgs_rotated[i] = best
+        if max_height is not None and y + h > max_height:
+            return None
+        x = int(xs[start])
+        imgs_pos[i] = (x, y)
+        max_w = max(max_w, x + w)
+        max_h = max(max_h, y + h)
+
+        if use_waste_map:
+            # the gaps between the covered segments and the bottom of the rect
+            seg_ends = np.append(xs[1:], bin_width)[start:end]
+            left = xs[start:end]
+            right = np.minimum(seg_ends, x + w)
+            gaps = ys[start:end] < y
+            holes = np.column_stack([left[gaps], ys[start:end][gaps],
+                                     (right - left)[gaps], y - ys[start:end][gaps]])
+            waste_rects = np.concatenate([waste_rects, holes])
+
+        # replace the covered segments by the new one, the last covered segment may continue after it
+        new_xs = [x]
+        new_ys = [y + h]
+        seg_end = xs[end] if end < len(xs) else bin_width
+        if x + w < seg_end:
+            new_xs.append(x + w)
+            new_ys.append(int(ys[end - 1]))
+        xs = np.concatenate([xs[:start], new_xs, xs[end:]])
+        ys = np.concatenate([ys[:start], new_ys, ys[end:]])
+
+        # merge neighbouring segments at the same level
+        keep = np.ones(len(xs), dtype=bool)
+        keep[1:] = ys[1:] != ys[:-1]
+        xs = xs[keep]
+        ys = ys[keep]
+
+    return imgs_pos, max_w, max_h, imgs_rotated
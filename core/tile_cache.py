@@ -0,0 +1,91 @@
+import os
+import hashlib
+import threading
+import numpy as np
+
+from collections import OrderedDict
+
+
+class TileCache:
+    """Cache of resized tiles stored as .npy files in a directory.
+    Tiles are memory mapped when loaded and the least recently used tiles
+    are removed once the total size is above max_bytes"""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        # file name -> size in bytes, ordered from least to most recently used
+        self.files = OrderedDict()
+        entries = [entry for entry in os.scandir(directory) if entry.name.endswith(".npy")]
+        for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+            self.files[entry.name] = entry.stat().st_size
+        self.total_bytes = sum(self.files.values())
+
+    def file_name(self, key):
+        return hashlib.sha1(repr(key).encode()).hexdigest() + ".npy"
+
+    def get(self, key):
+        """Memory mapped tile of the key, or None when it isn't cached"""
+        name = self.file_name(key)
+        path = os.path.join(self.directory, name)
+        with self.lock:
+            if name not in self.files:
+                return None
+            self.files.move_to_end(name)
+
+        try:
+            tile = np.load(path, mmap_mode='r')
+            # the modification time keeps the use order between sessions
+            os.utime(path)
+        except (OSError, ValueError):
+            self.remove(name)
+            return None
+        return tile
+
+    def put(self, key, tile):
+        name = self.file_name(key)
+        path = os.path.join(self.directory, name)
+
+        # write to a temporary file first so a tile is never read half written
+        temp_path = "{}.{}.tmp".format(path, threading.get_ident())
+        with open(temp_path, 'wb') as file:
+            np.save(file, np.ascontiguousarray(tile))
+        os.replace(temp_path, path)
+        size = os.path.getsize(path)
+
+        with self.lock:
+            self.total_bytes += size - self.files.get(name, 0)
+            self.files[name] = size
+            self.files.move_to_end(name)
+        self.trim()
+
+    def trim(self):
+        """Removes the least recently used tiles until the cache fits in max_bytes"""
+        evict = []
+        with self.lock:
+            while self.total_bytes > self.max_bytes and len(self.files) > 1:
+                old_name, old_size = self.files.popitem(last=False)
+                self.total_bytes -= old_size
+                evict.append(old_name)
+
+        for old_name in evict:
+            self.remove_file(old_name)
+
+    def remove(self, name):
+        with self.lock:
+            self.total_bytes -= self.files.pop(name, 0)
+        self.remove_file(name)
+
+    def remove_file(self, name):
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            # still memory mapped or already removed
+            pass
+
+    def clear(self):
+        for name in list(self.files):
+            self.remove(name)
@@ -1,4 +1,6 @@
+import os
 import bpy
+import time
 from bpy.types import Operator, OperatorFileListElement
 from bpy_extras.io_utils import ImportHelper
 from .utils import (
@@ -6,51 +8,180 @@ from .utils import (
     shuffle_packing_list, 
     preview_packed_image, 
     create_test_imgs,
+    load_image_files,
 )
+from .packing_list import (
+    add_images,
+    remove_items,
+    clear_packing_list,
+    sort_packing_list_by,
+    update_item_sizes,
+    SORT_MODES,
+)
+from .core.auto_tune import workers_available
 from .packing_modes import (
-    SquarePacking,
-    RowPacking,
-    NextFitPacking,
+    get_img_fingerprint,
+    get_worker_count,
+    get_packed_images,
+    get_page_layouts,
+    iter_output_pages,
 )
 
 
+def get_packing_imgs(image_packer):
+    img_list = []
+    for img in image_packer.packing_list:
+        img_list.append(img["image"])
+
+    if image_packer.random_order:
+        shuffle_packing_list(img_list)
+    return img_list
+
+
+def get_fingerprints(packing_list):
+    fingerprints = []
+    scratch = None
+    for item in packing_list:
+        fingerprint, scratch = get_img_fingerprint(item.image, scratch)
+        fingerprints.append(fingerprint)
+    return fingerprints
+
+
+def get_changed_imgs(packing_list, fingerprints):
+    """Pointers of the images whose fingerprint changed since the last pack"""
+    changed_imgs = set()
+    for item, fingerprint in zip(packing_list, fingerprints):
+        if item.fingerprint != fingerprint:
+            changed_imgs.add(item.image.as_pointer())
+    return changed_imgs
+
+
 class GenerateOpr(Operator):
     bl_label = "Generate Packed Image"
     bl_idname = "opr.image_packer_generate"
     bl_description = "Packs all the images from the packing list and generates a new image based on the packing settings"
 
+    # Seconds of packing work done per timer event before the UI gets control back
+    time_slice = 0.05
+
+    _timer = None
+    _steps = None
+    _fingerprints = None
+    _page_count = 1
+
     @classmethod
     def poll(cls, context):
         return context.scene.image_packer.packing_list
-        
-    def execute(self, context):
-        scene = context.scene
-        image_packer = scene.image_packer
+
+    def prepare_fingerprints(self, image_packer):
+        """Pointers of the changed images when packing incrementally, otherwise None"""
+        if not image_packer.incremental:
+            self._fingerprints = None
+            return None
+
+        self._fingerprints = get_fingerprints(image_packer.packing_list)
+        return get_changed_imgs(image_packer.packing_list, self._fingerprints)
+
+    def finish_pack(self, context, area):
+        image_packer = context.scene.image_packer
         pref = context.preferences.addons[__package__].preferences
 
-        img_list = []
-        for img in context.scene.image_packer.packing_list:
-            img_list.append(img["image"])
-
-        if image_packer.random_order:
-            shuffle_packing_list(img_list)
-
-        match image_packer.packing_mode:
-            case "square_packing":
-                SquarePacking(img_list, image_packer)
-            case "row_packing":
-                RowPacking(img_list, image_packer)
-            case "col_packing":
-                RowPacking(img_list, image_packer, False)
-            case "nextfit_packing":
-                NextFitPacking(img_list, image_packer)
-        
-        
-        if(pref.auto_open_preview or get_active_img() == None):
-            packed_img = bpy.data.images.get(image_packer.image_pack_name)
-            bpy.context.area.spaces.active.image = packed_img
+        if image_packer.packing_mode == "auto_packing" and get_worker_count() > 1 and not workers_available():
+            self.report({'WARNING'}, "Auto Packing ran in a single process, its worker processes can't import the add-on")
+
+        # only store the fingerprints once the packed image is up to date
+        if self._fingerprints is not None:
+            for item, fingerprint in zip(image_packer.packing_list, self._fingerprints):
+                item.fingerprint = fingerprint
+        # the images are loaded now, so the sizes of lazily added images are known
+        update_item_sizes(image_packer.packing_list)
+
+        if image_packer.output_mode == "disk":
+            if self._page_count > 1:
+                self.report({'INFO'}, "Saved {} pages next to {}".format(self._page_count, image_packer.output_filepath))
+            else:
+                self.report({'INFO'}, "Saved packed image to {}".format(image_packer.output_filepath))
+            return
+
+        if area is not None and (pref.auto_open_preview or get_active_img() == None):
+            packed_img = get_packed_images(image_packer)[0]
+            area.spaces.active.image = packed_img
+
+    def execute(self, context):
+        image_packer = context.scene.image_packer
+        img_list = get_packing_imgs(image_packer)
+        changed_imgs = self.prepare_fingerprints(image_packer)
+        try:
+            pages = get_page_layouts(img_list, image_packer)
+        except ValueError as error:
+            # the images don't fit in the maximal size
+            self.report({'ERROR'}, str(error))
+            return {"CANCELLED"}
+
+        for _ in iter_output_pages(pages, image_packer, changed_imgs):
+            pass
+        self._page_count = len(pages)
+        self.finish_pack(context, context.area)
         return {"FINISHED"}
 
+    def invoke(self, context, event):
+        image_packer = context.scene.image_packer
+        img_list = get_packing_imgs(image_packer)
+        changed_imgs = self.prepare_fingerprints(image_packer)
+        try:
+            pages = get_page_layouts(img_list, image_packer)
+        except ValueError as error:
+            self.report({'ERROR'}, str(error))
+            return {"CANCELLED"}
+
+        self._steps = iter_output_pages(pages, image_packer, changed_imgs)
+        self._page_count = len(pages)
+        self._area = context.area
+        self._done = 0
+        self._total = len(img_list)
+
+        wm = context.window_manager
+        wm.progress_begin(0, self._total)
+        self._timer = wm.event_timer_add(0.01, window=context.window)
+        wm.modal_handler_add(self)
+        return {"RUNNING_MODAL"}
+
+    def end_modal(self, context):
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+        context.workspace.status_text_set(None)
+        # closing the generator releases the partial pixels and removes partial files
+        self._steps.close()
+        self._steps = None
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self.end_modal(context)
+            self.report({'INFO'}, "Cancelled packing images")
+            return {"CANCELLED"}
+
+        if event.type != 'TIMER':
+            return {"PASS_THROUGH"}
+
+        end_time = time.perf_counter() + self.time_slice
+        try:
+            while time.perf_counter() < end_time:
+                next(self._steps)
+                self._done += 1
+        except StopIteration:
+            self.end_modal(context)
+            self.finish_pack(context, self._area)
+            return {"FINISHED"}
+        except Exception:
+            self.end_modal(context)
+            raise
+
+        context.window_manager.progress_update(self._done)
+        context.workspace.status_text_set(
+            "Packing images {}/{}, press Esc to cancel".format(self._done, self._total))
+        return {"RUNNING_MODAL"}
+
 
 class PreviewOpr(Operator):
     bl_label = "Preview Packed Image"
@@ -59,14 +190,14 @@ class PreviewOpr(Operator):
 
     @classmethod
     def poll(cls, context):
-        return bpy.data.images.get(context.scene.image_packer.image_pack_name) is not None
+        return bool(get_packed_images(context.scene.image_packer))
     
     def execute(self, context):
         scene = context.scene
         image_packer = scene.image_packer
         pref = context.preferences.addons[__package__].preferences
 
-        preview_packed_image(bpy.data.images.get(image_packer.image_pack_name), pref.preview_window)
+        preview_packed_image(get_packed_images(image_packer)[0], pref.preview_window)
 
         return {"FINISHED"}
 
@@ -74,15 +205,15 @@ class PreviewOpr(Operator):
 class RemovePackedOpr(Operator):
     bl_label = "Remove Packed Image"
     bl_idname = "opr.image_packer_remove"
-    bl_description = "Removes the packed image based on the name"
+    bl_description = "Removes the packed image or its pages based on the name"
 
     @classmethod
     def poll(cls, context):
-        return bpy.data.images.get(context.scene.image_packer.image_pack_name) is not None
+        return bool(get_packed_images(context.scene.image_packer))
     
     def execute(self, context):
-        bpy.data.images.remove(bpy.data.images.get(
-            context.scene.image_packer.image_pack_name))
+        for packed_image in get_packed_images(context.scene.image_packer):
+            bpy.data.images.remove(packed_image)
 
         return {"FINISHED"}
 
@@ -97,22 +228,14 @@ class AddToPackingListOpr(Operator):
         return context.scene.image_packer.packing_list != None
 
     def execute(self, context):
-        list = context.scene.image_packer.packing_list
         pref = context.preferences.addons[__package__].preferences
         new_item = get_active_img()
 
         if new_item is None:
             self.report({'INFO'}, "Open an image in the Image Editor to add to the Packing List")
             return {"CANCELLED"}
-        
-        # If duplicates are allowed or the new item is not in the packing list 
-        if pref.allow_duplicates or new_item.name not in [item.name for item in list]:
-            item = list.add()
-            item.name = new_item.name
-            item.image = new_item
-            # Set the packing_list_index to the index of the last item in the list
-            context.scene.image_packer.packing_list_index = len(list) - 1
 
+        add_images(context.scene.image_packer, [new_item], pref.allow_duplicates)
         return {"FINISHED"}
     
 class AddFromFilesOpr(Operator, ImportHelper):
@@ -134,27 +257,14 @@ class AddFromFilesOpr(Operator, ImportHelper):
         if not self.directory or len(self.files) == 0:
             return {'CANCELLED'}
 
-        old_ptrs = {img.as_pointer() for img in bpy.data.images}
+        filepaths = [os.path.join(self.directory, file.name) for file in self.files]
+        imgs, failed = load_image_files(filepaths)
 
-        import os
-        for file in self.files:
-            filepath = os.path.join(self.directory, file.name)
-            bpy.ops.image.open(filepath=filepath, check_existing=True)
-
-        list = context.scene.image_packer.packing_list
         pref = context.preferences.addons[__package__].preferences
+        add_images(context.scene.image_packer, imgs, pref.allow_duplicates)
 
-        new_images = [img for img in bpy.data.images if img.as_pointer() not in old_ptrs]
-        for new_img in new_images:
-            # If duplicates are allowed or the new item is not in the packing list 
-            if pref.allow_duplicates or new_img.name not in [item.name for item in list]:
-                item = list.add()
-                item.name = new_img.name
-                item.image = new_img
-
-        # Set the packing_list_index to the index of the last item in the list
-        context.scene.image_packer.packing_list_index = len(list) - 1
-
+        if failed:
+            self.report({'WARNING'}, "Couldn't open {} of the files".format(len(failed)))
         return {'FINISHED'}
 
 class RemoveFromPackingListOpr(Operator):
@@ -168,11 +278,8 @@ class RemoveFromPackingListOpr(Operator):
         return context.scene.image_packer.packing_list != None and len(context.scene.image_packer.packing_list) > 0
 
     def execute(self, context):
-        list = context.scene.image_packer.packing_list
-        index = context.scene.image_packer.packing_list_index
-
-        list.remove(index)
-        context.scene.image_packer.packing_list_index = min(max(0, index - 1), len(list))
+        image_packer = context.scene.image_packer
+        remove_items(image_packer, [image_packer.packing_list_index])
 
         return {'FINISHED'}
 
@@ -187,16 +294,9 @@ class ClearPackingListOpr(Operator):
         return context.scene.image_packer.packing_list != None and len(context.scene.image_packer.packing_list) > 0
 
     def execute(self, context):
-        # Get the specified list from the current scene
-        list = context.scene.image_packer.packing_list
-
-        # Clear the list
-        list.clear()
+        clear_packing_list(context.scene.image_packer)
         self.report({'INFO'}, "Cleared Packing List")
 
-        # Set index of the list to 0
-        context.scene.image_packer.packing_list_index = 0
-
         return {'FINISHED'}
 
 class MoveItemOpr(Operator):
@@ -234,6 +334,31 @@ class MoveItemOpr(Operator):
         return {'FINISHED'}
 
 
+class SortPackingListOpr(Operator):
+    bl_label = "Apply Sort"
+    bl_idname = "opr.image_packer_sort_packing_list"
+    bl_description = "Reorders the packing list in the shown order, which is the order the images are packed in"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    sort_mode: bpy.props.EnumProperty(
+        name="Sort By",
+        items=SORT_MODES,
+        default='area')
+
+    reverse: bpy.props.BoolProperty(
+        name="Reverse",
+        default=False)
+
+    @classmethod
+    def poll(cls, context):
+        return context.scene.image_packer.packing_list
+
+    def execute(self, context):
+        sort_packing_list_by(context.scene.image_packer, self.sort_mode, self.reverse)
+
+        return {'FINISHED'}
+
+
 # Extra Options
 class RemoveOtherImgOpr(Operator):
     bl_label = "Remove unused images in blend file"
@@ -257,21 +382,12 @@ class AddAllImgOpr(Operator):
         return context.scene.image_packer.packing_list != None
 
     def execute(self, context):
-        list = context.scene.image_packer.packing_list
+        image_packer = context.scene.image_packer
         pref = context.preferences.addons[__package__].preferences
 
-        for image in bpy.data.images:
-            new_item = image
-            not_packing_img = new_item.name != context.scene.image_packer.name
-
-            # If duplicates are allowed or the new item is not in the packing list 
-            if  not_packing_img and (pref.allow_duplicates or new_item.name not in [item.name for item in list]):
-                item = list.add()
-                item.name = new_item.name
-                item.image = new_item
-                # Set the packing_list_index to the index of the last item in the list
-                context.scene.image_packer.packing_list_index = len(list) - 1
-            
+        imgs = [image for image in bpy.data.images if image.name != image_packer.name]
+        add_images(image_packer, imgs, pref.allow_duplicates)
+
         return {"FINISHED"}
 
 class MakeTestShapesOpr(Operator):
@@ -281,21 +397,12 @@ class MakeTestShapesOpr(Operator):
 
     def execute(self, context):
         image_packer = context.scene.image_packer
-        packing_list = context.scene.image_packer.packing_list
 
         min_size = [image_packer.min_width, image_packer.min_height]
         max_size = [image_packer.max_width, image_packer.max_height]
 
         img_list = create_test_imgs(image_packer.amount, min_size, max_size)
-
-        name_list = []
-        for item in packing_list:
-            name_list.append(item.name)
-        for img in img_list:
-            if img.name not in name_list:
-                packing_list.add()
-                packing_list[-1].image = img
-                packing_list[-1].name = img.name
+        add_images(image_packer, img_list)
 
         return {"FINISHED"}
 
@@ -309,6 +416,7 @@ classes = (
     RemoveFromPackingListOpr,
     ClearPackingListOpr,
     MoveItemOpr,
+    SortPackingListOpr,
     RemoveOtherImgOpr,
     AddAllImgOpr,
     MakeTestShapesOpr,
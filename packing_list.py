@@ -0,0 +1,294 @@
+import os
+import bpy
+import numpy as np
+
+from collections import Counter
+from bpy.app.handlers import persistent
+
+from .core.png_reader import read_png_header
+
+
+# Orders of the packing list, name or the (w, h) size of the images
+SORT_MODES = (
+    ('none', "Packing Order", "Order in which the images are packed"),
+    ('name', "Name", "Sort on the name of the images"),
+    ('area', "Area", "Sort on the amount of pixels of the images"),
+    ('width', "Width", "Sort on the width of the images"),
+    ('height', "Height", "Sort on the height of the images"),
+    ('aspect', "Aspect Ratio", "Sort on the width divided by the height of the images"),
+)
+
+
+class PackingListIndex:
+    """Counts of the item names and image pointers of a packing list, so membership checks don't
+    have to walk the list. It is rebuilt when the list length no longer matches"""
+
+    def __init__(self, packing_list):
+        self.names = Counter(item.name for item in packing_list)
+        self.pointers = Counter(item.image.as_pointer() for item in packing_list if item.image)
+        self.length = len(packing_list)
+
+    def contains(self, img):
+        """Whether an item has the name or the image, images renamed after adding are still found"""
+        return img.name in self.names or img.as_pointer() in self.pointers
+
+    def add(self, name, img):
+        self.names[name] += 1
+        if img:
+            self.pointers[img.as_pointer()] += 1
+        self.length += 1
+
+    def remove(self, name, img):
+        self.names[name] -= 1
+        if self.names[name] <= 0:
+            del self.names[name]
+        if img:
+            pointer = img.as_pointer()
+            self.pointers[pointer] -= 1
+            if self.pointers[pointer] <= 0:
+                del self.pointers[pointer]
+        self.length -= 1
+
+
+# ImagePacker pointer -> index of its packing list
+packing_list_indices = {}
+
+
+def get_packing_list_index(image_packer):
+    """The index of the packing list, rebuilt when the list changed outside of these functions"""
+    key = image_packer.as_pointer()
+    index = packing_list_indices.get(key)
+    if index is None or index.length != len(image_packer.packing_list):
+        index = packing_list_indices[key] = PackingListIndex(image_packer.packing_list)
+    return index
+
+
+def invalidate_packing_list_index(image_packer=None):
+    """Drops the index of a packing list, or of all packing lists"""
+    if image_packer is None:
+        packing_list_indices.clear()
+    else:
+        packing_list_indices.pop(image_packer.as_pointer(), None)
+
+
+# True while the functions here change the image of items, they keep the index up to date
+changing_items = False
+
+
+def item_image_changed(item):
+    """Keeps the name of an item and the index in sync when its image is swapped in the panel"""
+    if changing_items:
+        return
+    if item.image:
+        item.name = item.image.name
+    item.size = get_known_size(item.image) if item.image else (0, 0)
+    invalidate_packing_list_index(item.id_data.image_packer)
+
+
+def get_known_size(img):
+    """(w, h) of an image without loading its pixels, PNG files are read from their header.
+    (0, 0) when the size isn't known before the image is loaded"""
+    if img.has_data:
+        return tuple(img.size)
+    if img.source == 'GENERATED':
+        return img.generated_width, img.generated_height
+    if img.source == 'FILE' and not img.packed_file:
+        filepath = bpy.path.abspath(img.filepath)
+        if filepath.lower().endswith(".png") and os.path.isfile(filepath):
+            try:
+                return read_png_header(filepath)[:2]
+            except (OSError, ValueError):
+                pass
+    return 0, 0
+
+
+def add_images(image_packer, imgs, allow_duplicates=False):
+    """Appends the images to the packing list, images already in it are skipped unless duplicates
+    are allowed. The active item is set once, to the last added image. Returns the amount added"""
+    global changing_items
+    packing_list = image_packer.packing_list
+    index = get_packing_list_index(image_packer)
+    # the index can hold images deleted since it was built, whose pointer may be reused, so it is
+    # rebuilt once before an image is skipped
+    verified = False
+
+    added = 0
+    changing_items = True
+    try:
+        for img in imgs:
+            if not allow_duplicates and index.contains(img):
+                if verified:
+                    continue
+                index = packing_list_indices[image_packer.as_pointer()] = PackingListIndex(packing_list)
+                verified = True
+                if index.contains(img):
+                    continue
+            item = packing_list.add()
+            item.name = img.name
+            item.image = img
+            item.size = get_known_size(img)
+            index.add(item.name, img)
+            added += 1
+    finally:
+        changing_items = False
+
+    if added:
+        image_packer.packing_list_index = len(packing_list) - 1
+    return added
+
+
+def remove_items(image_packer, indices):
+    """Removes the items at the indices from the packing list, the active item stays on the item
+    before the first removed one"""
+    packing_list = image_packer.packing_list
+    index = get_packing_list_index(image_packer)
+
+    indices = sorted(set(indices), reverse=True)
+    stale = False
+    for i in indices:
+        item = packing_list[i]
+        # the pointer of a deleted image is unknown, so the index is rebuilt instead
+        stale = stale or item.image is None
+        index.remove(item.name, item.image)
+        packing_list.remove(i)
+    if stale:
+        invalidate_packing_list_index(image_packer)
+
+    if indices:
+        image_packer.packing_list_index = min(max(0, indices[-1] - 1), max(0, len(packing_list) - 1))
+
+
+def clear_packing_list(image_packer):
+    image_packer.packing_list.clear()
+    invalidate_packing_list_index(image_packer)
+    image_packer.packing_list_index = 0
+
+
+def get_sort_keys(packing_list, sort_mode):
+    """Sort key of every item as an array, read from the stored item sizes so the images aren't
+    touched. Items of unknown size sort last"""
+    if sort_mode == 'name':
+        return np.array([item.name.lower() for item in packing_list])
+
+    sizes = np.zeros(len(packing_list) * 2, np.int32)
+    packing_list.foreach_get("size", sizes)
+    width, height = sizes.reshape(-1, 2).T.astype(np.float64)
+    match sort_mode:
+        case 'area':
+            keys = width * height
+        case 'width':
+            keys = width
+        case 'height':
+            keys = height
+        case 'aspect':
+            keys = width / np.maximum(height, 1)
+        case _:
+            raise ValueError("Unknown sort mode {}".format(sort_mode))
+    return np.where((width > 0) & (height > 0), keys, np.inf)
+
+
+def get_sort_order(keys, reverse=False):
+    """Indices of the keys in sorted order, equal keys keep their order like sorted"""
+    if not reverse:
+        return np.argsort(keys, kind='stable')
+    return len(keys) - 1 - np.argsort(keys[::-1], kind='stable')[::-1]
+
+
+def get_packing_list_order(packing_list, sort_mode, reverse=False):
+    """Indices of the items in the order of one of the SORT_MODES, items of unknown size stay last"""
+    keys = get_sort_keys(packing_list, sort_mode)
+    if reverse and sort_mode != 'name':
+        keys = np.where(np.isinf(keys), -np.inf, keys)
+    return get_sort_order(keys, reverse)
+
+
+def move_to_order(image_packer, order):
+    """Reorders the packing list so the item at order[i] ends up at i. The active item stays
+    on the same image"""
+    packing_list = image_packer.packing_list
+    order = [int(original) for original in order]
+    active = image_packer.packing_list_index
+
+    # Collections can only move single items, so every item is moved from its current position
+    # to its sorted position. The items before the target are in place and the others keep their
+    # original order, so the current position follows from the amount of unplaced items before it,
+    # which a Fenwick tree over the original positions counts
+    size = len(order)
+    tree = [0] * (size + 1)
+    for i in range(1, size + 1):
+        tree[i] += 1
+        parent = i + (i & -i)
+        if parent <= size:
+            tree[parent] += tree[i]
+
+    for target, original in enumerate(order):
+        unplaced_before = 0
+        i = original
+        while i > 0:
+            unplaced_before += tree[i]
+            i -= i & -i
+        current = target + unplaced_before
+        if current != target:
+            packing_list.move(current, target)
+
+        i = original + 1
+        while i <= size:
+            tree[i] -= 1
+            i += i & -i
+
+    if 0 <= active < len(order) and order.index(active) != active:
+        image_packer.packing_list_index = order.index(active)
+
+
+def sort_packing_list_by(image_packer, sort_mode, reverse=False):
+    """Reorders the packing list on one of the SORT_MODES, items of unknown size stay last"""
+    if sort_mode != 'none':
+        update_item_sizes(image_packer.packing_list)
+        move_to_order(image_packer, get_packing_list_order(image_packer.packing_list, sort_mode, reverse))
+
+
+def update_item_sizes(packing_list, pointers=None):
+    """Stores the size of the loaded images, for images whose size wasn't known when added or
+    that were scaled or reloaded since. Only the images with the given pointers when given"""
+    for item in packing_list:
+        if item.image and item.image.has_data and (pointers is None or item.image.as_pointer() in pointers):
+            size = tuple(item.image.size)
+            if tuple(item.size) != size:
+                item.size = size
+
+
+@persistent
+def clear_indices_handler(*args):
+    # undo and loading files replace the packing lists without changing their length
+    invalidate_packing_list_index()
+
+
+@persistent
+def image_sizes_handler(scene, depsgraph):
+    # scaled and reloaded images keep the sorting of the packing list on their current size
+    pointers = {update.id.original.as_pointer() for update in depsgraph.updates
+                if isinstance(update.id, bpy.types.Image)}
+    if pointers:
+        update_item_sizes(scene.image_packer.packing_list, pointers)
+
+
+HANDLERS = (
+    bpy.app.handlers.load_post,
+    bpy.app.handlers.undo_post,
+    bpy.app.handlers.redo_post,
+)
+
+
+def register():
+    for handlers in HANDLERS:
+        handlers.append(clear_indices_handler)
+    bpy.app.handlers.depsgraph_update_post.append(image_sizes_handler)
+
+
+def unregister():
+    if image_sizes_handler in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(image_sizes_handler)
+    for handlers in HANDLERS:
+        if clear_indices_handler in handlers:
+            handlers.remove(clear_indices_handler)
+    invalidate_packing_list_index()
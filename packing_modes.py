@@ -1,15 +1,67 @@
+import os
 import bpy
+import hashlib
+import tempfile
 import numpy as np
 
-from math import ceil, floor, sqrt
-from operator import mod
-from .utils import median_of_list
+from .core.items import make_items, item_rect, items_on_page
+from .core.resample import PIXEL_DTYPES, pixels_to_float
+from .core.layout_cache import LRUCache
+from .core.tile_cache import TileCache
+from .core.composite import make_packed_pixels, iter_col_pixels, iter_packed_bands
+from .core.png_writer import PNGStreamWriter
+from .core.layout import ItemTooLargeError, compute_packing_layout, pack_pages
 from mathutils import Color
 
 
-def remove_imgs(imgs):
-    for img in imgs:
-        bpy.data.images.remove(img)
+# ImagePacker properties that change the layout of the packed image
+LAYOUT_PROPS = (
+    "packing_mode",
+    "side_mode",
+    "side_switch",
+    "side_length",
+    "keep_aspect_ratio",
+    "padding",
+    "aspect_ratio_mode",
+    "aspect_ratio_width",
+    "aspect_ratio_height",
+    "random_order",
+    "random_seed",
+    "maxrects_heuristic",
+    "skyline_waste_map",
+    "shelf_mode",
+    "balanced_rows",
+    "justify_rows",
+    "shortest_column",
+    "sort_by_height",
+    "allow_rotation",
+    "optimize_size",
+    "power_of_two",
+    "max_size",
+    "auto_seeds",
+    "auto_time_budget",
+    "max_atlas_size",
+)
+
+# ImagePacker properties that change the pixels but not the layout
+OUTPUT_PROPS = (
+    "resample_filter",
+    "composite_mode",
+    "output_mode",
+    "image_pack_name",
+    "output_filepath",
+    "band_height",
+    "page_mode",
+)
+
+layout_cache = LRUCache(32)
+# output target -> pixels key of the last finished pack
+last_outputs = {}
+# packed image name -> (layout key, placement key, output key) of the last finished pack
+last_layouts = {}
+# (output mode, packed image name or output file) -> pages written by the last pack to it
+written_pages = {}
+disk_tile_cache = None
 
 
 def get_srgba_bg_color():
@@ -19,292 +71,353 @@ def get_srgba_bg_color():
     return (color[0], color[1], color[2], bg_linear_RGBA[3])
 
 
-def make_packed_image(name, size):
+def get_worker_count():
+    pref = bpy.context.preferences.addons[__package__].preferences
+    return pref.worker_count or os.cpu_count() or 1
+
+
+def get_tile_cache():
+    """The disk tile cache from the preferences, or None when it is disabled"""
+    global disk_tile_cache
+    pref = bpy.context.preferences.addons[__package__].preferences
+    if not pref.tile_cache:
+        return None
+
+    directory = bpy.path.abspath(pref.tile_cache_dir) if pref.tile_cache_dir else \
+        bpy.utils.extension_path_user(__package__, path="tile_cache", create=True)
+    max_bytes = pref.tile_cache_size * 1024 * 1024
+    if disk_tile_cache is None or disk_tile_cache.directory != directory:
+        disk_tile_cache = TileCache(directory, max_bytes)
+    if disk_tile_cache.max_bytes != max_bytes:
+        disk_tile_cache.max_bytes = max_bytes
+        disk_tile_cache.trim()
+    return disk_tile_cache
+
+
+def get_tile_key(img, img_rect, filter_type, dtype):
+    """Disk cache key of a resized image, None for images that aren't saved files"""
+    if img.packed_file or img.source == 'GENERATED':
+        return None
+    state = get_img_pixels_state(img)
+    if state is None:
+        return None
+
+    filepath = bpy.path.abspath(img.filepath)
+    w, h, rotated = img_rect[2:]
+    colorspace = img.colorspace_settings.name
+    return filepath, state[1], os.path.getsize(filepath), colorspace, w, h, rotated, filter_type, np.dtype(dtype).str
+
+
+def get_packed_dtype(imgs, image_packer):
+    """Pixel format to composite in, auto uses 8-bit when all images are byte images"""
+    mode = image_packer.composite_mode
+    if mode == "auto":
+        mode = "float" if any(img.is_float for img in imgs) else "byte"
+    return PIXEL_DTYPES[mode]
+
+
+def load_packed_bytes(name, packed_pixels, band_height=256):
+    """Loads 8-bit packed pixels into the Blender image with the given name through a temporary
+    PNG file, written in bands straight from the packed pixels. bpy only takes float pixels, which
+    would need a float copy four times the size of the atlas. The file is packed into the blend file"""
+    h, w = packed_pixels.shape[:2]
+    fd, filepath = tempfile.mkstemp(suffix=".png")
+    os.close(fd)
+    try:
+        writer = PNGStreamWriter(filepath, w, h, level=1)
+        # PNG rows go from top to bottom, Blender pixels from bottom to top
+        for top in range(h, 0, -band_height):
+            writer.write_rows(packed_pixels[max(0, top - band_height):top][::-1])
+        writer.close()
+
+        packed_image = bpy.data.images.get(name)
+        if packed_image is None:
+            packed_image = bpy.data.images.load(filepath, check_existing=False)
+            packed_image.name = name
+        else:
+            if packed_image.packed_file:
+                packed_image.unpack(method='REMOVE')
+            packed_image.source = 'FILE'
+            packed_image.filepath_raw = filepath
+            packed_image.reload()
+        packed_image.pack()
+        packed_image.filepath_raw = ""
+    finally:
+        os.remove(filepath)
+    return packed_image
+
+
+def write_packed_image(name, packed_pixels):
+    """Writes the packed pixels into the Blender image with the given name"""
+    if packed_pixels.dtype == np.uint8:
+        return load_packed_bytes(name, packed_pixels)
+
+    h, w = packed_pixels.shape[:2]
     if name in bpy.data.images:
         packed_image = bpy.data.images[name]
-        packed_image.scale(size[0], size[1])
+        packed_image.scale(w, h)
     else:
-        packed_image = bpy.data.images.new(name, width=size[0], height=size[1])
+        packed_image = bpy.data.images.new(name, width=w, height=h)
 
-    # prepare packed_pixels array
-    packed_pixels = np.ones((size[1], size[0], 4), 'f')
-    packed_pixels[:, :, :] = get_srgba_bg_color()
+    # Blender only takes float pixels, so half pixels are converted at the very end
+    packed_image.pixels.foreach_set(pixels_to_float(packed_pixels).ravel())
+    packed_image.update()
+    return packed_image
 
-    return packed_image, packed_pixels
 
+def read_img_pixels(img, scratch=None):
+    """Reads the pixels of an image into a (h, w, 4) array, reusing scratch when it is large enough"""
+    w, h = img.size
+    if scratch is None or scratch.size < w * h * 4:
+        scratch = np.empty(w * h * 4, 'f')
+    img_pixels = scratch[:w * h * 4]
+    img.pixels.foreach_get(img_pixels)
+    return img_pixels.reshape(h, w, 4), scratch
 
-def update_col_pixels(packed_image, packed_pixels, imgs, imgs_pos):
-    packed_h = packed_image.size[1]
 
-    for i in range(len(imgs)):
-        img = imgs[i]
-        w, h = img.size
-        x, y = imgs_pos[i]
-        
-        img_pixels = np.ones((h, w, 4), 'f')
-        img.pixels.foreach_get(img_pixels.ravel())
-        packed_pixels[packed_h-(y+h): packed_h-y, x: x+w, :4] = img_pixels
+def get_pixel_sources(imgs, items, filter_type, dtype):
+    """read_pixels and tile_key callbacks of the core compositing, for the images of the items"""
+    def read_pixels(i, scratch):
+        return read_img_pixels(imgs[i], scratch)
 
-    packed_image.pixels.foreach_set(packed_pixels.ravel())
-    packed_image.update()
+    def tile_key(i):
+        return get_tile_key(imgs[i], item_rect(items[i]), filter_type, dtype)
 
+    return read_pixels, tile_key
 
-def get_square_imgs_pos(imgs, squares):
-    imgs_pos = []
-    for i in range(len(imgs)):
-        x = mod(i, squares) * imgs[i].size[0]
-        y = floor(i / squares) * imgs[i].size[1]
-        imgs_pos.append((x, y))
-    return imgs_pos
 
+def get_layout_key(packing_list, image_packer):
+    """Key of the layout, based on the identity and size of the images and the layout settings"""
+    imgs_key = tuple((img.name, img.as_pointer(), tuple(img.size)) for img in packing_list)
+    props_key = tuple(getattr(image_packer, prop) for prop in LAYOUT_PROPS)
+    return imgs_key, props_key
 
-def add_padding_img(img, padding):
-    w, h = img.size
-    img_pixels = np.ones((h, w, 4), 'f')
-    img.pixels.foreach_get(img_pixels.ravel())
-    
-    w += 2 * padding
-    h += 2 * padding
-    
-    padding_pixels = np.ones((h, w, 4), 'f')
-    padding_pixels[:, :, :] = get_srgba_bg_color()
-    padding_pixels[padding: h-padding, padding: w-padding] = img_pixels
-    
-    img.scale(w, h)
-    img.pixels.foreach_set(padding_pixels.ravel())
-    img.update()
-    return
-
-
-def fill_padding_img(img, padding):
-    w, h = img.size
-    img_pixels = np.ones((h, w, 4), 'f')
-    img.pixels.foreach_get(img_pixels.ravel())
-    padding_pixels = np.ones((h + padding[1], w + padding[0], 4), 'f')
-    padding_pixels[:, :, :] = get_srgba_bg_color()
-
-    # center the image in the padding
-    w_offset = floor(padding[0] / 2)
-    h_offset = floor(padding[1] / 2)
-    padding_pixels[h_offset: h_offset + h, w_offset: w_offset + w] = img_pixels
-
-    img.scale(w + padding[0], h + padding[1])
-    img.pixels.foreach_set(padding_pixels.ravel())
-    img.update()
-    return
-
-
-def med_ratio_from_size(sizes):
-    ratios = []
-    for size in sizes:
-        ratios.append(size[0] / size[1])
-    return median_of_list(ratios)
-
-def areas_from_size(sizes):
-    areas = []
-    for size in sizes:
-        areas.append(size[0] * size[1])
-    return areas
-
-
-def img_side_length(imgs, image_packer):
-    mode = image_packer.side_mode
-    row_mode = image_packer.side_switch == "width"
-
-    total_side = []
-    for img in imgs:
-        total_side.append( img.size[ int(row_mode)])
-    
-    # set side length based on side mode
-    if "med" in mode:
-        side = ceil( median_of_list(total_side))
-    elif "avg" in mode:
-        side = ceil( sum(total_side) / len(total_side))
-    elif "min" in mode:
-        side = min(total_side)
-    elif "max" in mode:
-        side = max(total_side)
-    else:
-        side = image_packer.side_length
 
-    return side
+def get_output_key(image_packer):
+    """Key of the settings that change the pixels but not the layout"""
+    props_key = tuple(getattr(image_packer, prop) for prop in OUTPUT_PROPS)
+    return props_key, tuple(image_packer.bg_color)
 
 
-def SquarePacking(packing_list, image_packer):
-    padding = image_packer.padding
+def get_img_pixels_state(img):
+    """State that changes whenever the pixels of an image may have changed, None if it can't be known.
+    Saved files use their modification time, packed files their data and generated images their
+    settings, other images are unknown"""
+    if img.is_dirty:
+        return None
 
-    side = img_side_length(packing_list, image_packer)
-    squares = ceil( sqrt( len(packing_list)))
-    max_w = (side + 2*padding) * squares
+    if img.packed_file:
+        return "packed", hashlib.blake2b(img.packed_file.data, digest_size=16).hexdigest()
+    if img.source == 'GENERATED':
+        return ("generated", img.generated_type, tuple(img.generated_color), img.generated_width,
+                img.generated_height, img.use_generated_float)
 
-    temp_imgs = []
-    for img in packing_list:
-        temp_img = bpy.data.images.new(
-            img.name + "_temp", width=img.size[0], height=img.size[1])
-        temp_img.pixels[:] = img.pixels
+    filepath = bpy.path.abspath(img.filepath)
+    if not filepath or not os.path.isfile(filepath):
+        return None
+    return img.filepath, os.path.getmtime(filepath)
 
-        if image_packer.keep_aspect_ratio:
-            w, h = temp_img.size
-            scale_factor = min(side / w, side / h)
-            new_size = [floor(w * scale_factor), floor(h * scale_factor)]
-            fill_padding = [side - new_size[0], side - new_size[1]]
-            temp_img.scale(new_size[0], new_size[1])
-            fill_padding_img(temp_img, fill_padding)
-        else:
-            temp_img.scale(side, side)
 
-        add_padding_img(temp_img, padding)
-        temp_imgs.append(temp_img)
+def get_placement_key(size, items):
+    """Key of the size and item rects of a packed image. A page of a larger layout can move when
+    images on other pages change, so the layout key of its own images isn't enough"""
+    return tuple(size), items.tobytes()
 
-    imgs_pos = get_square_imgs_pos(temp_imgs, squares)
-    col_img, col_pixels = make_packed_image(image_packer.image_pack_name, (max_w, max_w))
-    update_col_pixels(col_img, col_pixels, temp_imgs, imgs_pos)
-    remove_imgs(temp_imgs)
 
+def get_pixels_key(packing_list, image_packer, size, items):
+    """Key of the packed pixels, None when a source image has unknown changes"""
+    imgs_state = tuple(get_img_pixels_state(img) for img in packing_list)
+    if None in imgs_state:
+        return None
 
-def RowPacking(packing_list, image_packer, row_mode=True):
-    padding = image_packer.padding
+    return (get_layout_key(packing_list, image_packer), get_placement_key(size, items),
+            imgs_state, get_output_key(image_packer))
 
-    side = img_side_length(packing_list, image_packer)
 
-    # make temp imgs based on side and img aspect ratio
-    sizes = []
-    temp_imgs = []
-    for img in packing_list:
-        if row_mode:
-            w = ceil(img.size[0] * (side / img.size[1]))
-            h = side
-        else:
-            w = side
-            h = ceil((img.size[1] * side) / img.size[0])
-
-        temp_img = bpy.data.images.new(
-            img.name + "_temp", width=img.size[0], height=img.size[1])
-        temp_img.pixels[:] = img.pixels
-        temp_img.scale(w, h)
-
-        w += 2*padding
-        h += 2*padding
-        sizes.append((w, h))
-        
-        add_padding_img(temp_img, padding)
-        temp_imgs.append(temp_img)
-    side += 2*padding
-
-    match image_packer.aspect_ratio_mode:
-        case "med":
-            ratio = med_ratio_from_size(sizes)
-        case "custom":
-            ratio = image_packer.aspect_ratio_width / image_packer.aspect_ratio_height
-
-    area = sum(areas_from_size(sizes))
-    threshold = ceil( sqrt(area* ratio))
-    
-    # Initialize the list of image positions
-    imgs_pos = []
-
-    # Iterate through the temp_imgs
-    if row_mode:
-        # Initialize the current position and the maximum width and height
-        x = y = 0
-        max_w = 0
-        for temp_img in temp_imgs:
-            w, h = temp_img.size
-            # Check if the img fits within the current position
-            if x + w > threshold:
-                # The img doesn't fit, so start a new line
-                x = 0
-                y += h
-            # The img fits, so place it at the current position
-            imgs_pos.append((x, y))
-            x += w
-            max_w = max(max_w, x)
-        max_h = max(imgs_pos, key=lambda x: x[1])[1] + h
-
-    # Keep track of img heights per row to place the next row on.
-    # Crop to last row max height to remove empty space.
+def get_img_fingerprint(img, scratch=None):
+    """Size plus the file state of an image, or a hash of its pixels when it was edited in Blender"""
+    w, h = img.size
+    state = get_img_pixels_state(img)
+    if state is None:
+        img_pixels, scratch = read_img_pixels(img, scratch)
+        state = hashlib.blake2b(img_pixels, digest_size=16).hexdigest()
+    return "{}x{}:{}".format(w, h, state), scratch
+
+
+def get_page_suffix(image_packer, page, page_mode=None):
+    """Suffix of a page of the packed image, _0, _1, ... or the UDIM tile .1001, .1002, ..."""
+    if page is None:
+        return ""
+    if (page_mode or image_packer.page_mode) == "udim":
+        return ".{}".format(1001 + page)
+    return "_{}".format(page)
+
+
+def get_output_name(image_packer, page=None, page_mode=None):
+    return image_packer.image_pack_name + get_page_suffix(image_packer, page, page_mode)
+
+
+def get_output_filepath(image_packer, page=None, page_mode=None):
+    root, ext = os.path.splitext(bpy.path.abspath(image_packer.output_filepath))
+    return root + get_page_suffix(image_packer, page, page_mode) + ext
+
+
+def get_packed_images(image_packer):
+    """The packed image, or its pages when it was split in pages"""
+    packed_image = bpy.data.images.get(image_packer.image_pack_name)
+    if packed_image is not None:
+        return [packed_image]
+
+    pages = []
+    while (page_image := bpy.data.images.get(get_output_name(image_packer, len(pages)))) is not None:
+        pages.append(page_image)
+    return pages
+
+
+def is_output_current(image_packer, pixels_key, size, page=None):
+    """Checks whether the last pack to the same output used the exact same images and settings"""
+    if image_packer.output_mode == "disk":
+        target = get_output_filepath(image_packer, page)
+        exists = os.path.isfile(target)
+    else:
+        target = get_output_name(image_packer, page)
+        packed_image = bpy.data.images.get(target)
+        exists = packed_image is not None and tuple(packed_image.size) == tuple(size)
+
+    return exists and pixels_key is not None and last_outputs.get(target) == pixels_key
+
+
+def read_packed_pixels(packed_image):
+    w, h = packed_image.size
+    packed_pixels = np.empty((h, w, 4), 'f')
+    packed_image.pixels.foreach_get(packed_pixels.ravel())
+    return packed_pixels
+
+
+def iter_output_packed_image(packing_list, image_packer, size, items, changed_imgs=None, page=None):
+    """Composites the packed image into a Blender image or streams it to disk, yields after each image.
+    The Blender image is only touched once all images are composited.
+    When changed_imgs holds the pointers of the changed images and the layout and output settings
+    are the same as the last pack, only the regions of those images are composited into the existing packed image.
+    items holds the placed item of every image in the packing list.
+    A page number outputs to the image or file of that page"""
+    pixels_key = get_pixels_key(packing_list, image_packer, size, items)
+    if is_output_current(image_packer, pixels_key, size, page):
+        return
+
+    dtype = get_packed_dtype(packing_list, image_packer)
+    composite_key = (get_layout_key(packing_list, image_packer), get_placement_key(size, items),
+                     get_output_key(image_packer))
+    name = get_output_name(image_packer, page)
+    packed_image = bpy.data.images.get(name)
+    filter_type = image_packer.resample_filter
+
+    if (changed_imgs is not None and image_packer.output_mode == "image"
+            and last_layouts.get(name) == composite_key
+            and packed_image is not None and tuple(packed_image.size) == tuple(size)):
+        target = name
+        changed = [i for i, img in enumerate(packing_list) if img.as_pointer() in changed_imgs]
+        if changed:
+            changed_list = [packing_list[i] for i in changed]
+            read_pixels, tile_key = get_pixel_sources(changed_list, items[changed], filter_type, dtype)
+            packed_pixels = read_packed_pixels(packed_image)
+            yield from iter_col_pixels(packed_pixels, items[changed], read_pixels, filter_type,
+                                       get_worker_count(), get_tile_cache(), tile_key)
+            write_packed_image(target, packed_pixels)
+
+    elif image_packer.output_mode == "disk":
+        target = get_output_filepath(image_packer, page)
+        read_pixels, tile_key = get_pixel_sources(packing_list, items, filter_type, dtype)
+        yield from iter_packed_bands(target, size, items, read_pixels, filter_type, image_packer.band_height,
+                                     get_srgba_bg_color(), dtype, get_tile_cache(), tile_key)
     else:
-        # Calculate the number of images per row
-        sides = int((threshold - threshold % side) / side)
-        heights = [0] * sides
-        for i, temp_img in enumerate(temp_imgs):
-            h = temp_img.size[1]
-            col_index = i % sides
-            width = col_index * side
-            height = heights[col_index]
-
-            imgs_pos.append((width, height))
-            heights[col_index] += h
-
-        max_w = side * sides
-        max_h = max(heights)
-
-    packed_image, packed_pixels = make_packed_image(image_packer.image_pack_name, (max_w, max_h))
-    update_col_pixels(packed_image, packed_pixels, temp_imgs, imgs_pos)
-    remove_imgs(temp_imgs)
-
-
-def pack_rectangles(imgs, max_width, max_height):
-    x = 0  # Start the current position at (0, 0)
-    y = 0
-    imgs_pos = []  # Initialize the list of imgs_pos
-    row_heights = []  # Initialize the list of row heights
-    max_w = 0  # Initialize the maximum width
-    max_h = 0  # Initialize the maximum height
-
-    # Iterate through the imgs
-    for img in imgs:
-        # Check if the img fits within the current position
-        if img.size[0] <= max_width - x and img.size[1] <= max_height - y:
-            # The img fits, so add its corner to the list
-            imgs_pos.append((x, y))
-            x += img.size[0]  # Update the current position
-            row_heights.append(y + img.size[1])  # Update the row height
-            max_w = max(max_w, x)  # Update the maximum width
-            max_h = max(max_h, y + img.size[1])  # Update the maximum height
+        target = name
+        read_pixels, tile_key = get_pixel_sources(packing_list, items, filter_type, dtype)
+        packed_pixels = make_packed_pixels(size, get_srgba_bg_color(), dtype)
+        yield from iter_col_pixels(packed_pixels, items, read_pixels, filter_type,
+                                   get_worker_count(), get_tile_cache(), tile_key)
+        write_packed_image(target, packed_pixels)
+        last_layouts[target] = composite_key
+
+    last_outputs[target] = pixels_key
+
+
+def iter_output_pages(pages, image_packer, changed_imgs=None):
+    """Outputs every (packing_list, size, items) page of get_page_layouts one after the other,
+    so only the pixels of one page are in memory at a time"""
+    remove_stale_pages(pages, image_packer)
+
+    if len(pages) == 1:
+        packing_list, size, items = pages[0]
+        yield from iter_output_packed_image(packing_list, image_packer, size, items, changed_imgs)
+        return
+
+    for page, (packing_list, size, items) in enumerate(pages):
+        yield from iter_output_packed_image(packing_list, image_packer, size, items, changed_imgs, page)
+
+
+def remove_stale_pages(pages, image_packer):
+    """Removes the pages the last pack to the same output wrote that this pack won't write again.
+    Only pages recorded in written_pages are removed, never images in the packing list"""
+    disk = image_packer.output_mode == "disk"
+    get_target = get_output_filepath if disk else get_output_name
+    page_numbers = [None] if len(pages) == 1 else range(len(pages))
+    targets = [get_target(image_packer, page) for page in page_numbers]
+    output = (image_packer.output_mode, get_target(image_packer))
+    packing_images = {img for packing_list, _, _ in pages for img in packing_list}
+
+    for target in written_pages.get(output, ()):
+        if target in targets:
+            continue
+        if disk:
+            if os.path.isfile(target):
+                os.remove(target)
         else:
-            # The img doesn't fit, so start a new line
-            x = 0
-            y = max(row_heights)  # Start the new line at the maximum row height
-            imgs_pos.append((x, y))
-            x += img.size[0]  # Update the current position
-            row_heights.append(y + img.size[1])  # Update the row height
-            max_w = max(max_w, x)  # Update the maximum width
-            max_h = max(max_h, y + img.size[1])  # Update the maximum height
-
-    # At this point, the imgs_pos list contains the lower left corners of the packed rectangles
-    # and max_w and max_h contain the maximum width and height of the packed rectangles
-    return imgs_pos, max_w, max_h
-
-
-def NextFitPacking(packing_list, image_packer):
-    sizes = []
-    temp_imgs = []
-    for img in packing_list:
-        temp_img = bpy.data.images.new(
-            img.name + "_temp", width=img.size[0], height=img.size[1])
-        temp_img.pixels[:] = img.pixels
-        add_padding_img(temp_img, image_packer.padding)
-        temp_imgs.append(temp_img)
-
-        w, h = temp_img.size
-        sizes.append((w, h))
-        
-    match image_packer.aspect_ratio_mode:
-        case "med":
-            ratio = med_ratio_from_size(sizes)
-        case "custom":
-            ratio = image_packer.aspect_ratio_width / image_packer.aspect_ratio_height
-
-    # Amount of area needed to place all pixel data + 50% empty space (cropped later)
-    total_area = sum(areas_from_size(sizes))
-    area = ceil(total_area * 1.5)  
-
-    max_height = ceil(sqrt(area / ratio))
-    max_width = ceil(area / max_height)
-
-    imgs_pos, max_w, max_h = pack_rectangles(temp_imgs, max_width, max_height)
-    size = (max_w, max_h)
-    packed_image, packed_pixels = make_packed_image(image_packer.image_pack_name, size)
-    update_col_pixels(packed_image, packed_pixels, temp_imgs, imgs_pos)
-    remove_imgs(temp_imgs)
\ No newline at end of file
+            page_image = bpy.data.images.get(target)
+            if page_image is not None and page_image not in packing_images:
+                bpy.data.images.remove(page_image)
+    written_pages[output] = targets
+
+
+def get_packing_items(packing_list):
+    """Items of the images in the packing list, the id of every item is its index in the list"""
+    return make_items([tuple(img.size) for img in packing_list])
+
+
+def get_packing_layout(packing_list, image_packer):
+    """Packed image size and the placed items of the images for the selected packing mode.
+    Layouts are cached, so unchanged images and settings skip the packing"""
+    layout_key = get_layout_key(packing_list, image_packer)
+    layout = layout_cache.get(layout_key)
+    if layout is not None:
+        return layout
+
+    layout = compute_packing_layout(get_packing_items(packing_list), image_packer, workers=get_worker_count())
+    layout_cache.put(layout_key, layout)
+    return layout
+
+
+def get_page_layouts(packing_list, image_packer):
+    """(packing_list, size, items) of every page, a single page unless the layout is larger than
+    the maximal atlas size"""
+    if not image_packer.max_atlas_size:
+        return [(packing_list, *get_packing_layout(packing_list, image_packer))]
+
+    layout_key = ("pages",) + get_layout_key(packing_list, image_packer)
+    pages = layout_cache.get(layout_key)
+    if pages is not None:
+        return pages
+
+    try:
+        page_sizes, items = pack_pages(get_packing_items(packing_list), image_packer, get_worker_count())
+    except ItemTooLargeError as error:
+        raise ValueError("{} is larger than the maximal atlas size of {}px".format(
+            packing_list[error.item_id].name, error.max_size)) from None
+
+    pages = []
+    for page, size in enumerate(page_sizes):
+        placed = items_on_page(items, page)
+        pages.append(([packing_list[i] for i in placed["id"].tolist()], size, placed))
+
+    layout_cache.put(layout_key, pages)
+    return pages
@@ -36,6 +36,33 @@ class ImagePackerPreferences(bpy.types.AddonPreferences):
         description="Adds all existing images to the exclude list. This prevents the option 'Remove All Images' from deleting existing images"
     )
 
+    worker_count: IntProperty(
+        name="Worker Threads",
+        default=0,
+        min=0,
+        description="Number of threads used to resize and place the images while packing, 0 uses all CPU cores"
+    )
+
+    tile_cache: BoolProperty(
+        name="Disk Tile Cache",
+        default=False,
+        description="Store resized images on disk so later packs with the same files and settings skip the resizing"
+    )
+
+    tile_cache_dir: StringProperty(
+        name="Cache Directory",
+        default="",
+        subtype='DIR_PATH',
+        description="Directory of the tile cache, leave empty to use the add-on user directory"
+    )
+
+    tile_cache_size: IntProperty(
+        name="Max Cache Size (MB)",
+        default=2048,
+        min=1,
+        description="Least recently used tiles are removed once the cache is larger than this"
+    )
+
     def draw(self, context):
         layout = self.layout
 
@@ -49,6 +76,14 @@ class ImagePackerPreferences(bpy.types.AddonPreferences):
         box.label(text="Packing List Settings")
         box.prop(self, "allow_duplicates")
 
+        box = layout.box()
+        box.label(text="Performance Settings")
+        box.prop(self, "worker_count")
+        box.prop(self, "tile_cache")
+        if self.tile_cache:
+            box.prop(self, "tile_cache_dir")
+            box.prop(self, "tile_cache_size")
+
         # Add a button to apply the preferences
         layout.operator("opr.image_packer_apply_preferences")
 
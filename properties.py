@@ -1,6 +1,7 @@
 import bpy
 from bpy.props import (
     IntProperty,
+    IntVectorProperty,
     EnumProperty,
     BoolProperty,
     StringProperty,
@@ -10,12 +11,29 @@ from bpy.props import (
     FloatVectorProperty,
 )
 
+from .packing_list import item_image_changed
+
 
 class PackItem(bpy.types.PropertyGroup):
     """Group of properties representing an item in the list."""
+    def image_callback(self, context):
+        item_image_changed(self)
+
     image: PointerProperty(
         name="Image",
-        type=bpy.types.Image)
+        type=bpy.types.Image,
+        update=image_callback)
+
+    fingerprint: StringProperty(
+        name="Fingerprint",
+        description="Size and content state of the image at the last pack",
+        options={'HIDDEN'})
+
+    size: IntVectorProperty(
+        name="Size",
+        size=2,
+        description="Size of the image, (0, 0) until it is known without loading the image",
+        options={'HIDDEN'})
 
 
 class ImagePacker(bpy.types.PropertyGroup):
@@ -46,6 +64,14 @@ class ImagePacker(bpy.types.PropertyGroup):
         "Scales images to have the same width, keeps the images in order"),
         ('nextfit_packing', "Next Fit Packing",
         "Keeps the size and order of the images, but may result in gaps between the rows"),
+        ('maxrects_packing', "MaxRects Packing",
+        "Keeps the size of the images and fills the gaps between them, the densest but slowest mode"),
+        ('skyline_packing', "Skyline Packing",
+        "Keeps the size of the images and stacks them on the lowest spot, fast and dense for many small images"),
+        ('auto_packing', "Auto Packing",
+        "Keeps the size of the images and tries every packer, heuristic and order, keeps the densest layout"),
+        ('exact_packing', "Exact Packing",
+        "Keeps the size of the images and searches the smallest packed image, for small amounts of images"),
     ]
 
     packing_mode: EnumProperty(
@@ -54,6 +80,98 @@ class ImagePacker(bpy.types.PropertyGroup):
         description="Change the algorithm for packing the images"
     )
 
+    maxrects_heuristic: EnumProperty(
+        name="Heuristic",
+        items=[
+            ('short_side', "Best Short Side Fit", "Place images where the shortest leftover side is the smallest"),
+            ('area', "Best Area Fit", "Place images in the smallest free area they fit in"),
+            ('bottom_left', "Bottom Left", "Place images as high and then as far left as possible"),
+            ('contact_point', "Contact Point", "Place images where they touch the most other images, slowest heuristic"),
+        ],
+        default='short_side',
+        description="Rule used to choose the free space each image is placed in"
+    )
+
+    balanced_rows: BoolProperty(
+        name="Balanced Rows",
+        default=False,
+        description="Choose where rows (or columns) break so they are as even as possible, which makes the packed image smaller"
+    )
+
+    justify_rows: BoolProperty(
+        name="Justify",
+        default=False,
+        description="Scale each row (or column) slightly so it fills the packed image exactly"
+    )
+
+    shortest_column: BoolProperty(
+        name="Shortest Column",
+        default=False,
+        description="Place each image on the currently shortest column instead of the next column, makes the columns more even"
+    )
+
+    sort_by_height: BoolProperty(
+        name="Sort by Height",
+        default=False,
+        description="Place the tallest images first, makes the columns even more equal but changes the order"
+    )
+
+    shelf_mode: EnumProperty(
+        name="Shelves",
+        items=[
+            ('next_fit', "Next Fit", "Keep the order of the images and start a new shelf when an image doesn't fit"),
+            ('first_fit', "First Fit Decreasing", "Sort the images on height and place each image on the first shelf it fits on"),
+            ('best_fit', "Best Fit Decreasing", "Sort the images on height and place each image on the fullest shelf it fits on"),
+        ],
+        default='next_fit',
+        description="How the images are divided over the shelves (rows)"
+    )
+
+    skyline_waste_map: BoolProperty(
+        name="Fill Gaps",
+        default=True,
+        description="Keep track of the gaps below the skyline and place smaller images in them"
+    )
+
+    allow_rotation: BoolProperty(
+        name="Allow Rotation",
+        default=False,
+        description="Turn images 90 degrees when they fit better that way"
+    )
+
+    auto_seeds: IntProperty(
+        name="Random Orders",
+        default=4,
+        min=0,
+        description="Number of random image orders tried beside the sorted orders"
+    )
+
+    auto_time_budget: FloatProperty(
+        name="Time Budget",
+        default=2.0,
+        min=0.1,
+        description="Seconds spent on trying layouts, the densest layout found so far is used"
+    )
+
+    optimize_size: BoolProperty(
+        name="Optimize Size",
+        default=False,
+        description="Search the width that gives the smallest packed image, packs the layout multiple times"
+    )
+
+    power_of_two: BoolProperty(
+        name="Power of Two",
+        default=False,
+        description="Round the size of the packed image up to powers of two"
+    )
+
+    max_size: IntProperty(
+        name="Max Size",
+        default=0,
+        min=0,
+        description="Maximal width and height of the packed image, 0 is no limit"
+    )
+
     side_mode: EnumProperty(
         name="Mode",
         items=[
@@ -81,12 +199,76 @@ class ImagePacker(bpy.types.PropertyGroup):
         description="Keep the aspect ratio of the images"
     )
 
+    resample_filter: EnumProperty(
+        name="Filter",
+        items=[
+            ('box', "Box", "Averages the covered pixels, fast and sharp when downscaling"),
+            ('bilinear', "Bilinear", "Linear interpolation between neighbouring pixels"),
+            ('lanczos', "Lanczos", "Windowed sinc filter, sharpest result but slowest"),
+        ],
+        default='bilinear',
+        description="Filter used to resize the images"
+    )
+
+    composite_mode: EnumProperty(
+        name="Pixel Format",
+        items=[
+            ('auto', "Auto", "Use 8-bit when all images in the packing list are byte images, otherwise float"),
+            ('float', "Float", "Composite in 32-bit float, keeps the full precision of float images"),
+            ('half', "Half Float", "Composite in 16-bit float, halves the memory of float"),
+            ('byte', "8-bit", "Composite in 8-bit per channel, uses a quarter of the memory of float"),
+        ],
+        default='auto',
+        description="Pixel format used in memory while compositing the packed image"
+    )
+
     image_pack_name: StringProperty(
         name="Name",
         default="New Packed Image",
         description="The name of the packed image"
     )
 
+    output_mode: EnumProperty(
+        name="Output",
+        items=[
+            ('image', "Blender Image", "Composite the packed image in memory as a Blender image"),
+            ('disk', "Stream to Disk", "Composite the packed image in bands and write each band to a PNG file, for images too large to fit in memory"),
+        ],
+        default='image',
+        description="Where the packed image is written to"
+    )
+
+    output_filepath: StringProperty(
+        name="File Path",
+        default="//packed_image.png",
+        subtype='FILE_PATH',
+        description="PNG file the packed image is streamed to"
+    )
+
+    band_height: IntProperty(
+        name="Band Height",
+        default=1024,
+        min=1,
+        description="Number of rows composited in memory at once when streaming to disk"
+    )
+
+    max_atlas_size: IntProperty(
+        name="Max Atlas Size",
+        default=0,
+        min=0,
+        description="Maximal width and height of a packed image, larger packs are split in pages. 0 is no limit"
+    )
+
+    page_mode: EnumProperty(
+        name="Pages",
+        items=[
+            ('pages', "Numbered", "Name the pages name_0, name_1, ..."),
+            ('udim', "UDIM", "Name the pages after UDIM tiles name.1001, name.1002, ..., saved pages load as a tiled image"),
+        ],
+        default='pages',
+        description="How the pages of a split packed image are named"
+    )
+
     aspect_ratio_mode: EnumProperty(
         name="Aspect Ratio",
         items=[
@@ -139,6 +321,12 @@ class ImagePacker(bpy.types.PropertyGroup):
         description="The length of the width/height for each image"
     )
 
+    incremental: BoolProperty(
+        name="Only Update Changed Images",
+        default=False,
+        description="When the layout didn't change, only composite the images that changed since the last pack into the existing packed image"
+    )
+
     # Random
     random_order: BoolProperty(
         name="Random Order",
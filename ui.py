@@ -1,4 +1,9 @@
+import re
 import bpy
+import fnmatch
+import numpy as np
+
+from .packing_list import SORT_MODES, get_packing_list_order
 
 
 def switch_packing_mode(image_packer, layout):
@@ -10,7 +15,52 @@ def switch_packing_mode(image_packer, layout):
             row = layout.row()
             row.prop(image_packer, "side_switch")
         
-    if (image_packer.packing_mode != "nextfit_packing"):
+    if (image_packer.packing_mode in ("row_packing", "col_packing")):
+        row = layout.row(align=True)
+        row.prop(image_packer, "balanced_rows")
+        if image_packer.balanced_rows:
+            row.prop(image_packer, "justify_rows")
+
+    if (image_packer.packing_mode == "col_packing" and not image_packer.balanced_rows):
+        row = layout.row(align=True)
+        row.prop(image_packer, "shortest_column")
+        if image_packer.shortest_column:
+            row.prop(image_packer, "sort_by_height")
+
+    if (image_packer.packing_mode == "nextfit_packing"):
+        row = layout.row()
+        row.prop(image_packer, "shelf_mode")
+
+    if (image_packer.packing_mode == "maxrects_packing"):
+        row = layout.row()
+        row.prop(image_packer, "maxrects_heuristic")
+
+    if (image_packer.packing_mode == "skyline_packing"):
+        row = layout.row()
+        row.prop(image_packer, "skyline_waste_map")
+
+    if (image_packer.packing_mode == "auto_packing"):
+        row = layout.row(align=True)
+        row.prop(image_packer, "auto_seeds")
+        row.prop(image_packer, "auto_time_budget")
+
+    if (image_packer.packing_mode == "exact_packing"):
+        row = layout.row()
+        row.prop(image_packer, "auto_time_budget")
+
+    if (image_packer.packing_mode in ("nextfit_packing", "maxrects_packing", "skyline_packing", "auto_packing", "exact_packing")):
+        row = layout.row()
+        row.prop(image_packer, "allow_rotation")
+
+    if (image_packer.packing_mode in ("nextfit_packing", "maxrects_packing", "skyline_packing")):
+        size_options = layout.column(align=True)
+        size_options.prop(image_packer, "optimize_size")
+        if image_packer.optimize_size:
+            row = size_options.row(align=True)
+            row.prop(image_packer, "power_of_two")
+            row.prop(image_packer, "max_size")
+
+    if (image_packer.packing_mode not in ("nextfit_packing", "maxrects_packing", "skyline_packing", "auto_packing", "exact_packing")):
         pack_options = layout.column(align=True)
         pack_options.prop(image_packer, "side_mode")
 
@@ -22,19 +72,66 @@ def switch_packing_mode(image_packer, layout):
             else:
                 pack_options.prop(image_packer, "side_length", text="Width")
 
+        row = layout.row()
+        row.prop(image_packer, "resample_filter")
+
 # == IMAGE LISTS
 class IMAGE_UL_PackingList(bpy.types.UIList):
+    sort_mode: bpy.props.EnumProperty(
+        name="Sort By",
+        items=SORT_MODES,
+        default='none')
+
     def draw_item(self, context, layout, data, item, icon, active_data,
                   active_propname, index):
         custom_icon = 'IMAGE'
 
         if self.layout_type in {'DEFAULT', 'COMPACT'}:
             layout.label(text=item.name, icon=custom_icon)
+            if self.sort_mode not in ('none', 'name') and item.size[0] and item.size[1]:
+                layout.label(text="{} x {}".format(*item.size))
 
         elif self.layout_type in {'GRID'}:
             layout.alignment = 'CENTER'
             layout.label(text="", icon=custom_icon)
 
+    def draw_filter(self, context, layout):
+        row = layout.row(align=True)
+        row.prop(self, "filter_name", text="")
+        row.prop(self, "use_filter_invert", text="", icon='ARROW_LEFTRIGHT')
+
+        row = layout.row(align=True)
+        row.prop(self, "sort_mode", text="")
+        row.prop(self, "use_filter_sort_reverse", text="",
+                 icon='SORT_DESC' if self.use_filter_sort_reverse else 'SORT_ASC')
+        if self.sort_mode != 'none':
+            opr = row.operator("opr.image_packer_sort_packing_list", text="Apply")
+            opr.sort_mode = self.sort_mode
+            opr.reverse = self.use_filter_sort_reverse
+
+    def filter_items(self, context, data, propname):
+        """Filters on the name and sorts on the stored sizes, so redraws don't touch the images"""
+        items = getattr(data, propname)
+        count = len(items)
+
+        flags = np.full(count, self.bitflag_filter_item, np.int32)
+        if self.filter_name:
+            pattern = self.filter_name if "*" in self.filter_name else "*{}*".format(self.filter_name)
+            match = re.compile(fnmatch.translate(pattern), re.IGNORECASE).match
+            found = np.fromiter((match(item.name) is not None for item in items), bool, count)
+            flags[found == self.use_filter_invert] = 0
+
+        if self.sort_mode == 'none':
+            return flags.tolist(), []
+        # The new position of every item, in the same order as Apply. Blender reverses the shown
+        # items for use_filter_sort_reverse, so the reversed order is reversed once more
+        order = get_packing_list_order(items, self.sort_mode, self.use_filter_sort_reverse)
+        if self.use_filter_sort_reverse:
+            order = order[::-1]
+        new_order = np.empty(count, np.int32)
+        new_order[order] = np.arange(count)
+        return flags.tolist(), new_order.tolist()
+
 
 # == MAIN PANEL
 class IMAGE_PT_image_packer(bpy.types.Panel):
@@ -117,6 +214,11 @@ class IMAGE_PT_PackingOptions(bpy.types.Panel):
         row.prop(image_packer, "padding")
         row.prop(image_packer, "bg_color", icon_only=True)
 
+        row = layout.row()
+        row.prop(image_packer, "composite_mode")
+        row = layout.row()
+        row.prop(image_packer, "incremental")
+
 class IMAGE_PT_PackingOpr(bpy.types.Panel):
     bl_label = "Packing Operators"
     bl_category = "Image Packer"
@@ -133,7 +235,19 @@ class IMAGE_PT_PackingOpr(bpy.types.Panel):
 
         # Packed Image Name
         row = layout.row()
-        row.prop(image_packer, "image_pack_name", icon_only=True)
+        row.prop(image_packer, "output_mode", text="")
+        if image_packer.output_mode == "disk":
+            col = layout.column(align=True)
+            col.prop(image_packer, "output_filepath", text="")
+            col.prop(image_packer, "band_height")
+        else:
+            row = layout.row()
+            row.prop(image_packer, "image_pack_name", icon_only=True)
+
+        row = layout.row(align=True)
+        row.prop(image_packer, "max_atlas_size")
+        if image_packer.max_atlas_size:
+            row.prop(image_packer, "page_mode", text="")
 
         if image_packer.packing_mode != "square_packing":
             row = layout.row(align=True)
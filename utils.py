@@ -42,12 +42,6 @@ def RGB_lerp(a, b, alpha):
     return out_color
 
 
-def median_of_list(n_list):
-    n_list.sort()
-    mid = len(n_list) // 2
-    return (n_list[mid] + n_list[~mid]) / 2
-
-
 def get_active_img():
     for area in bpy.context.screen.areas:
         if area.type == 'IMAGE_EDITOR':
@@ -72,6 +66,31 @@ def shuffle_packing_list(img_list):
     return random.shuffle(img_list)
 
 
+def load_image_files(filepaths, relative_path=True):
+    """Loads image files in one batch, files that are already loaded reuse their image.
+    The images are loaded lazily, so their pixels aren't read until they're packed.
+    Returns the images and the files that couldn't be opened"""
+    old_ptrs = {img.as_pointer() for img in bpy.data.images}
+    imgs = []
+    failed = []
+    for filepath in filepaths:
+        try:
+            img = bpy.data.images.load(filepath, check_existing=True)
+        except RuntimeError:
+            failed.append(filepath)
+            continue
+
+        # like the image open operator, new images get a path relative to the blend file
+        if relative_path and bpy.data.is_saved and img.as_pointer() not in old_ptrs:
+            try:
+                img.filepath = bpy.path.relpath(filepath)
+            except ValueError:
+                # the file is on another drive
+                pass
+        imgs.append(img)
+    return imgs, failed
+
+
 def create_test_imgs(amount, min_size, max_size):
     img_list = []
     random.seed(bpy.context.scene.image_packer.test_seed)